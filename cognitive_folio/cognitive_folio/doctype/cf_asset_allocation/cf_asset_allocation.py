@@ -4,6 +4,16 @@
 import frappe
 from frappe.model.document import Document
 
+# CF Security field compared against asset_class for each allocation type
+ALLOCATION_TYPE_FIELDS = {
+    "Asset Class": "security_type",
+    "Sector": "sector",
+    "Industry": "industry",
+    "Region": "region",
+    "Subregion": "subregion",
+    "Country": "country",
+}
+
 
 class CFAssetAllocation(Document):
     def validate(self):
@@ -67,24 +77,22 @@ class CFAssetAllocation(Document):
         # Calculate value for this asset class or category
         # This is a simplified approach - you'll need to adjust based on your data model
         asset_class_value = 0
-        
-        for holding in holdings:
-            if holding.security and holding.current_value:
-                security = frappe.get_doc("CF Security", holding.security)
-                
-                # Match based on allocation type
-                if self.allocation_type == "Asset Class" and hasattr(security, "security_type") and security.security_type == self.asset_class:
-                    asset_class_value += holding.current_value
-                elif self.allocation_type == "Sector" and hasattr(security, "sector") and security.sector == self.asset_class:
-                    asset_class_value += holding.current_value
-                elif self.allocation_type == "Industry" and hasattr(security, "industry") and security.industry == self.asset_class:
-                    asset_class_value += holding.current_value
-                elif self.allocation_type == "Region" and hasattr(security, "region") and security.region == self.asset_class:
-                    asset_class_value += holding.current_value
-                elif self.allocation_type == "Subregion" and hasattr(security, "subregion") and security.subregion == self.asset_class:
-                    asset_class_value += holding.current_value
-                elif self.allocation_type == "Country" and hasattr(security, "country") and security.country == self.asset_class:
-                    asset_class_value += holding.current_value
+
+        security_field = ALLOCATION_TYPE_FIELDS.get(self.allocation_type)
+        if security_field:
+            # Fetch the matching attribute for all held securities in one query
+            security_names = list({h.security for h in holdings if h.security and h.current_value})
+            security_values = dict(frappe.get_all(
+                "CF Security",
+                filters={"name": ["in", security_names]},
+                fields=["name", security_field],
+                as_list=True
+            )) if security_names else {}
+
+            for holding in holdings:
+                if holding.security and holding.current_value:
+                    if security_values.get(holding.security) == self.asset_class:
+                        asset_class_value += holding.current_value
                 
         # Calculate percentage
         self.current_percentage = (asset_class_value / total_value) * 100 if total_value > 0 else 0
@@ -93,3 +101,8 @@ class CFAssetAllocation(Document):
         """Calculate difference between target and current allocation"""
         if self.target_percentage is not None and self.current_percentage is not None:
             self.difference = self.current_percentage - self.target_percentage
+
+
+def on_doctype_update():
+    """Index allocations by portfolio in the order they are listed for prompts and target checks"""
+    frappe.db.add_index("CF Asset Allocation", ["portfolio", "allocation_type", "asset_class"])
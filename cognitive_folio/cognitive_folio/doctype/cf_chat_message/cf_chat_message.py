@@ -2,12 +2,14 @@ import frappe
 from frappe.model.document import Document
 import re
 from cognitive_folio.utils.markdown import safe_markdown_to_html
-from cognitive_folio.utils.helper import replace_variables, expand_financials_variable, expand_edgar_section_variable
+from cognitive_folio.utils.helper import replace_variables, expand_financials_variable, expand_edgar_section_variable, compile_holdings_section, render_holdings_section, PORTFOLIO_VARIABLE_PATTERN, SECURITY_VARIABLE_PATTERN, HOLDINGS_SECTION_PATTERN
 from cognitive_folio.utils.url_fetcher import fetch_and_embed_url_content
 
 class CFChatMessage(Document):
 
 	def validate(self):
+		# The chat is loaded at most once, for both the system prompt default and the prompt preview
+		chat = None
 		if not self.system_prompt:
 			chat = frappe.get_doc("CF Chat", self.chat)
 			if chat.system_prompt:
@@ -16,7 +18,7 @@ class CFChatMessage(Document):
 		# Convert variables in prompt on save for preview
 		if self.prompt and self.chat:
 			try:
-				chat = frappe.get_doc("CF Chat", self.chat)
+				chat = chat or frappe.get_doc("CF Chat", self.chat)
 				portfolio = None
 				if chat.portfolio:
 					portfolio = frappe.get_doc("CF Portfolio", chat.portfolio)
@@ -137,7 +139,7 @@ class CFChatMessage(Document):
 			security = frappe.get_doc("CF Security", chat.security)
 			security.ai_modified = frappe.utils.now_datetime().strftime('%Y-%m-%d %H:%M:%S')
 			security.save()
-		settings = frappe.get_single("CF Settings")
+		settings = frappe.get_cached_doc("CF Settings")
 		client = OpenAI(api_key=settings.get_password('open_ai_api_key'), base_url=settings.open_ai_url)
 	
 		# Initialize tokenizer for the model
@@ -295,10 +297,12 @@ class CFChatMessage(Document):
 	def prepare_prompt(self, portfolio, security):
 		"""Prepare the prompt with variable replacements"""
 		prompt = self.prompt
+		# Parsed JSON fields shared by all variable replacements in this prompt
+		variables_cache = {}
 		
 		# Replace ((variable)) with portfolio fields
 		if portfolio:
-			prompt = re.sub(r'\(\((\w+)\)\)', lambda match: replace_variables(match, portfolio), prompt)
+			prompt = PORTFOLIO_VARIABLE_PATTERN.sub(lambda match: replace_variables(match, portfolio, variables_cache), prompt)
 			
 			# Handle holdings processing (existing code)
 			holdings = frappe.get_all(
@@ -308,28 +312,24 @@ class CFChatMessage(Document):
 			)
 			
 			if holdings:
-				holdings_pattern = r'\*\*\*HOLDINGS\*\*\*(.*?)\*\*\*HOLDINGS\*\*\*'
-				holdings_matches = re.findall(holdings_pattern, prompt, re.DOTALL)
+				holdings_matches = HOLDINGS_SECTION_PATTERN.findall(prompt)
 				
 				if holdings_matches:
+					compiled_sections = [compile_holdings_section(holdings_content) for holdings_content in holdings_matches]
 					all_holding_sections = []
 					
 					for holding_info in holdings:
 						holding_doc = frappe.get_doc("CF Portfolio Holding", holding_info.name)
 						security_doc = frappe.get_doc("CF Security", holding_info.security)
 						
-						holding_sections = []
-						for holdings_content in holdings_matches:
-							holding_prompt = holdings_content
-							
-							holding_prompt = re.sub(r'\{\{([\w\.]+)\}\}', lambda match: replace_variables(match, security_doc), holding_prompt)
-							holding_prompt = re.sub(r'\[\[([\w\.]+)\]\]', lambda match: replace_variables(match, holding_doc), holding_prompt)
-							
-							holding_sections.append(holding_prompt)
+						holding_sections = [
+							render_holdings_section(compiled_section, security_doc, holding_doc, variables_cache)
+							for compiled_section in compiled_sections
+						]
 						
 						all_holding_sections.append("***HOLDINGS***" + "***HOLDINGS******HOLDINGS***".join(holding_sections) + "***HOLDINGS***")
 					
-					parts = re.split(r'\*\*\*HOLDINGS\*\*\*.*?\*\*\*HOLDINGS\*\*\*', prompt, flags=re.DOTALL)
+					parts = HOLDINGS_SECTION_PATTERN.split(prompt)
 					
 					final_parts = []
 					final_parts.append(parts[0])
@@ -351,7 +351,7 @@ class CFChatMessage(Document):
 				years = int(match.group(1))
 				quarters = int(match.group(2))
 				try:
-					return expand_financials_variable(security, years, quarters)
+					return expand_financials_variable(security, years, quarters, variables_cache)
 				except Exception as e:
 					frappe.log_error(f"Financials expansion failed for {security.name if hasattr(security, 'name') else 'unknown'}: {str(e)}")
 					return "[financial data unavailable]"
@@ -411,7 +411,7 @@ class CFChatMessage(Document):
 			prompt = re.sub(edgar_pattern, _replace_edgar, prompt)
 			
 			# Expand regular security field variables
-			prompt = re.sub(r'\{\{([\w\.]+)\}\}', lambda match: replace_variables(match, security), prompt)
+			prompt = SECURITY_VARIABLE_PATTERN.sub(lambda match: replace_variables(match, security, variables_cache), prompt)
 		
 		return prompt
 
@@ -598,7 +598,7 @@ class CFChatMessage(Document):
 		try:
 			from openai import OpenAI
 			
-			settings = frappe.get_single("CF Settings")
+			settings = frappe.get_cached_doc("CF Settings")
 			client = OpenAI(api_key=settings.get_password('open_ai_api_key'), base_url=settings.open_ai_url)
 			
 			# Create a focused prompt for search query extraction
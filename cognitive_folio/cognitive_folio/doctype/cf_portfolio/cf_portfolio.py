@@ -5,12 +5,124 @@ from datetime import datetime, timedelta
 from erpnext.setup.utils import get_exchange_rate
 from frappe import _
 from cognitive_folio.utils.markdown import safe_markdown_to_html
-from cognitive_folio.utils.helper import replace_variables, clear_string
+from cognitive_folio.utils.helper import replace_variables, clear_string, compile_holdings_section, render_holdings_section, PORTFOLIO_VARIABLE_PATTERN, HOLDINGS_SECTION_PATTERN
 import re
 import requests
 from dateutil import parser as date_parser
 from datetime import timezone
 
+# Static instructions for the holdings news evaluation prompt; per-security sections are appended
+NEWS_EVALUATION_PROMPT = """I own the following stocks that I previously evaluated based on fundamentals.  
+Analyze their recent **NEWS HEADLINES** (not full articles) for material changes that could alter valuation.
+
+⚠️ **Important**: You're analyzing headlines only, which may lack context. Be conservative - 
+when headlines are vague or could be routine, default to "No" unless clearly material.
+
+📅 **Headline Tags Explained**:
+- **[RECENT EARNINGS - Xd ago]** = Earnings/results announced within last 90 days (HIGH PRIORITY)
+- **[EARNINGS - Xd ago]** = Older earnings-related news (>90 days)
+- **[Xd ago]** = Recent non-earnings news (within 7 days)
+- No tag = Older general news
+
+### **Strict Evaluation Criteria**  
+Flag for re-evaluation **ONLY** if any of these occur:
+
+1. **Quarterly/Annual Earnings Reports**:
+	- **ANY quarterly or annual earnings release** (always material - updates valuation inputs)
+	- EPS/revenue miss/beat >5% vs. estimates (especially important)
+	- FY/quarterly guidance raised/lowered (any amount)
+	- Margin expansion/compression >200bps year-over-year
+	- Sequential revenue decline >10% (Q-over-Q)
+	- Major earnings restatements or accounting changes
+	- Management commentary on business outlook changes
+
+2. **Business Risks/Opportunities**:
+	- M&A, major partnerships, or divestitures (>$100M or >10% market cap)
+	- Product launches with >10% revenue impact potential
+	- Loss/gain of major customers (>10% revenue)
+
+3. **Financial Health Changes**:
+	- New debt/equity issuance changing capital structure >15%
+	- Credit rating downgrades (by major agencies)
+	- Cash flow warnings, liquidity crises, or covenant breaches
+	- Dividend cuts/suspensions or major buyback changes
+
+4. **Management/Legal Risks**:
+	- CEO/CFO/Chairman departure (especially unexpected)
+	- Fraud allegations, SEC investigations, or major lawsuits
+	- Criminal charges against executives
+
+5. **Strategic/Operational Changes**:
+	- Business model pivots or major restructuring
+	- Geographic expansion into major new markets
+	- Supply chain disruptions materially affecting production
+	- Facility closures or major layoffs (>10% workforce)
+
+6. **Regulatory/Political** (if applicable):
+	- FDA approvals/rejections (healthcare/pharma)
+	- Antitrust actions, regulatory bans, or license revocations
+	- Major policy changes materially affecting the business
+
+### **IGNORE These (Not Material)**
+- Routine analyst upgrades/downgrades without thesis changes
+- Minor price target adjustments (<15%)
+- General market commentary or sector trends
+- Insider trading <5% ownership or routine planned sales
+- Conference attendance or presentations
+- Awards, rankings, ESG scores, or "best company" lists
+- Stock splits or minor corporate actions
+
+### **Decision Rule**
+- When in doubt → default to **"No"** to avoid alert fatigue
+- Only flag clear, unambiguous material changes
+- If headline suggests materiality but lacks details → mark "Yes" with note
+
+**Response Format (Strict JSON Array):**
+[
+	{
+		"Company": "Company name",
+		"Symbol": "Ticker symbol",
+		"Evaluate": "Yes/No",
+		"Reasoning": "Criterion # (1-6) + one-sentence impact summary, or 'Insufficient detail in headline - requires follow-up'"
+	}
+]
+
+**Example:**
+[
+	{
+		"Company": "Acme Corp",
+		"Symbol": "ACME",
+		"Evaluate": "Yes",
+		"Reasoning": "Criterion 1: Q3 earnings beat by 8% with FY guidance raised 12%, indicating stronger-than-expected demand"
+	},
+	{
+		"Company": "Beta Inc",
+		"Symbol": "BETA",
+		"Evaluate": "No",
+		"Reasoning": "Analyst price target increase is routine, no fundamental change"
+	}
+]
+
+"""
+
+NEWS_EVALUATION_SECTION = "*Company*: {security_name}\n*Symbol*: {symbol}\n*Headlines*:\n{headlines}\n"
+
+# Pre-computed portfolio analytics fields injected into prompts as ((fieldname)), with their labels
+PORTFOLIO_ALLOCATION_VARIABLES = (
+	("sector_allocations", "Sector"),
+	("region_allocations", "Region"),
+	("country_allocations", "Country"),
+	("currency_exposure", "Currency"),
+)
+
+# Headline keywords that indicate earnings/results announcements
+EARNINGS_KEYWORDS = (
+	'earnings', 'results', 'quarterly', 'annual',
+	'q1', 'q2', 'q3', 'q4', 'fy', 'fiscal',
+	'revenue', 'profit', 'loss', 'guidance',
+	'eps', 'ebitda', 'beat', 'miss'
+)
+
 class CFPortfolio(Document):
 	def validate(self):
 		self.validate_disabled_state()
@@ -30,21 +142,7 @@ class CFPortfolio(Document):
 		"""Evaluate news for all holdings in this portfolio"""
 		
 		try:
-			from frappe.utils.background_jobs import enqueue
-			
-			# Create a unique job name to prevent duplicates
-			job_name = f"portfolio_news_evaluation_{self.name}_{frappe.utils.now()}"
-			
-			# Enqueue the job
-			enqueue(
-				method="cognitive_folio.cognitive_folio.doctype.cf_portfolio.cf_portfolio.process_evaluate_holdings_news",
-				queue="long",
-				timeout=1800,  # 30 minutes
-				job_id=job_name,
-				now=False,
-				portfolio_name=self.name,
-				user=frappe.session.user
-			)
+			enqueue_holdings_news_evaluation(self.name, frappe.session.user)
 			
 			frappe.msgprint(
 				_("Portfolio AI news evaluation has been queued. You will be notified when it's complete."),
@@ -96,36 +194,7 @@ class CFPortfolio(Document):
 	@frappe.whitelist()
 	def fetch_holdings_data(self, with_fundamentals=False):
 		"""Update prices for all holdings in this portfolio using batch requests"""
-		
-		# Get all holdings for this portfolio (excluding Cash type securities)
-		holdings = frappe.get_all(
-			"CF Portfolio Holding",
-			filters=[
-				["portfolio", "=", self.name],
-				["security_type", "=", "Stock"]
-			],
-			fields=["name", "security"]
-		)
-		
-		if not holdings:
-			frappe.msgprint("No holdings found in this portfolio")
-			return 0
-		
-		# Use enumerate to get a counter in the for loop
-		total_steps = len(holdings)
-		for counter, holding in enumerate(holdings, 1):
-			frappe.publish_progress(
-				percent=(counter)/total_steps * 100,
-				title="Processing",
-				description=f"Processing item {counter} of {total_steps} ({holding.security})"
-			)
-			security = frappe.get_doc("CF Security", holding.security)
-			if with_fundamentals:
-				security.fetch_data(with_fundamentals=True)
-			else:
-				security.fetch_data(with_fundamentals=False)
-			
-		return total_steps
+		return fetch_portfolio_holdings_data(self.name, with_fundamentals=with_fundamentals)
 	
 	@frappe.whitelist()
 	def generate_portfolio_ai_analysis(self):
@@ -205,14 +274,18 @@ class CFPortfolio(Document):
 				security_to_holdings_map[security] = []
 			security_to_holdings_map[security].append(holding.name)
 		
-		# Get securities data for batch request
+		# Get securities data for batch request (only the two fields needed, in one query)
 		securities_data = {}
-		for security_name in security_to_holdings_map:
-			security = frappe.get_doc("CF Security", security_name)
-			if security.symbol:
+		for security_name, symbol, currency in frappe.get_all(
+			"CF Security",
+			filters=[["name", "in", list(security_to_holdings_map)]],
+			fields=["name", "symbol", "currency"],
+			as_list=True
+		):
+			if symbol:
 				securities_data[security_name] = {
-					"symbol": security.symbol,
-					"currency": security.currency
+					"symbol": symbol,
+					"currency": currency
 				}
 		
 		# Extract symbols
@@ -304,12 +377,15 @@ class CFPortfolio(Document):
 	def calculate_portfolio_performance(self):
 		"""Calculate overall portfolio performance metrics"""
 		try:
-			# Get all holdings for this portfolio
-			holdings = frappe.get_all(
-				"CF Portfolio Holding",
-				filters={"portfolio": self.name},
-				fields=["*"]
-			)
+			# Get all holdings for this portfolio, selecting only the columns used by the
+			# totals and the analytics aggregations
+			holdings = frappe.db.sql("""
+				SELECT
+					security, security_name, current_value, base_cost, total_dividend_income,
+					dividend_yield, allocation_percentage, sector, region, country, currency
+				FROM `tabCF Portfolio Holding`
+				WHERE portfolio = %s
+			""", self.name, as_dict=True)
 			
 			if not holdings:
 				return {'success': False, 'error': _('No holdings found in this portfolio')}
@@ -318,12 +394,15 @@ class CFPortfolio(Document):
 			total_current_value = 0
 			total_cost = 0
 			total_dividend_income = 0
+			value_weighted_yield = 0
 			
-			# Calculate totals from holdings
+			# Calculate totals from holdings in a single pass
 			for holding in holdings:
-				total_current_value += flt(holding.current_value or 0)
+				current_value = flt(holding.current_value or 0)
+				total_current_value += current_value
 				total_cost += flt(holding.base_cost or 0)
 				total_dividend_income += flt(holding.total_dividend_income or 0)
+				value_weighted_yield += current_value * flt(holding.dividend_yield or 0, 6)
 			
 			# Set basic portfolio values
 			self.cost = total_cost
@@ -361,9 +440,7 @@ class CFPortfolio(Document):
 			# Calculate portfolio dividend yield (weighted average)
 			portfolio_dividend_yield = 0
 			if total_current_value > 0:
-				for holding in holdings:
-					weight = flt((holding.current_value or 0) / total_current_value, 6)
-					portfolio_dividend_yield += weight * flt(holding.dividend_yield or 0, 6)
+				portfolio_dividend_yield = flt(value_weighted_yield / total_current_value, 6)
 			
 			# Calculate annualized metrics if we have a start date
 			if self.start_date:
@@ -500,6 +577,82 @@ class CFPortfolio(Document):
 				"Portfolio Allocation Update Error"
 			)
 
+def fetch_portfolio_holdings_data(portfolio_name, with_fundamentals=False, securities=None, ignore_errors=False):
+	"""Update prices for all stock holdings of a portfolio; works from the name so callers need not load the portfolio.
+
+	Callers that already fetched the held securities (e.g. for many portfolios at once) can pass their names in.
+	With ignore_errors each security is fetched inside its own savepoint, so a failing symbol is rolled back
+	and logged while the others are kept for a single commit by the caller. Returns the number of securities updated.
+	"""
+	
+	# Get the securities of all holdings for this portfolio (excluding Cash type securities)
+	if securities is None:
+		securities = frappe.get_all(
+			"CF Portfolio Holding",
+			filters=[
+				["portfolio", "=", portfolio_name],
+				["security_type", "=", "Stock"]
+			],
+			pluck="security"
+		)
+	
+	if not securities:
+		frappe.msgprint("No holdings found in this portfolio")
+		return 0
+	
+	# Use enumerate to get a counter in the for loop
+	total_steps = len(securities)
+	failed = []
+	for counter, security_name in enumerate(securities, 1):
+		frappe.publish_progress(
+			percent=(counter)/total_steps * 100,
+			title="Processing",
+			description=f"Processing item {counter} of {total_steps} ({security_name})"
+		)
+		if not ignore_errors:
+			security = frappe.get_doc("CF Security", security_name)
+			security.fetch_data(with_fundamentals=with_fundamentals)
+			continue
+		
+		frappe.db.savepoint("fetch_holding_data")
+		try:
+			security = frappe.get_doc("CF Security", security_name)
+			security.fetch_data(with_fundamentals=with_fundamentals)
+		except Exception as e:
+			frappe.db.rollback(save_point="fetch_holding_data")
+			failed.append(f"{security_name}: {str(e)}")
+		else:
+			frappe.db.release_savepoint("fetch_holding_data")
+	
+	if failed:
+		# The savepoint rollback also discards errors logged by fetch_data, so log them once here
+		frappe.log_error(
+			f"Could not fetch data for {len(failed)} holdings of portfolio {portfolio_name}:\n" + "\n".join(failed),
+			"Fetch Holdings Data Error"
+		)
+		
+	return total_steps - len(failed)
+
+def enqueue_holdings_news_evaluation(portfolio_name, user):
+	"""Queue the AI news evaluation of a portfolio's holdings as a background job"""
+	from frappe.utils.background_jobs import enqueue
+	
+	# Create a unique job name to prevent duplicates
+	job_name = f"portfolio_news_evaluation_{portfolio_name}_{frappe.utils.now()}"
+	
+	# Enqueue the job
+	enqueue(
+		method="cognitive_folio.cognitive_folio.doctype.cf_portfolio.cf_portfolio.process_evaluate_holdings_news",
+		queue="long",
+		timeout=1800,  # 30 minutes
+		job_id=job_name,
+		now=False,
+		# Only queue once the fetched news is committed, and never for a rolled back fetch
+		enqueue_after_commit=True,
+		portfolio_name=portfolio_name,
+		user=user
+	)
+
 def _build_target_vs_actual_allocations(portfolio_name):
 	"""Build formatted text block for target vs actual allocations from CF Asset Allocation"""
 	allocations = frappe.get_all(
@@ -583,19 +736,17 @@ def process_portfolio_ai_analysis(portfolio_name, user):
 		
 		try:
 			# Get OpenWebUI settings
-			settings = frappe.get_single("CF Settings")
+			settings = frappe.get_cached_doc("CF Settings")
 			client = OpenAI(api_key=settings.get_password('open_ai_api_key'), base_url=settings.open_ai_url)
 			model = settings.default_ai_model
 			if not model:
 				raise ValueError(_('Default AI model is not configured in CF Settings'))
 			
-			# Get all holdings for this portfolio
+			# Get all holdings for this portfolio; reused below to expand the ***HOLDINGS*** sections
 			holdings = frappe.get_all(
 				"CF Portfolio Holding",
-				filters=[
-					["portfolio", "=", portfolio_name],
-				],
-				fields=["*"]
+				filters={"portfolio": portfolio_name},
+				fields=["name", "security"]
 			)
 			
 			if not holdings:
@@ -607,36 +758,25 @@ def process_portfolio_ai_analysis(portfolio_name, user):
 			if not prompt:
 				raise ValueError(_('No AI prompt configured for this portfolio. Please set an AI prompt or select a template.'))
 			
-			# Build target vs actual allocations text
-			target_allocations_text = _build_target_vs_actual_allocations(portfolio_name)
-			
-			# Format pre-computed analytics for injection
-			import json
-			sector_allocs_formatted = _format_json_allocations(portfolio.sector_allocations, "Sector")
-			region_allocs_formatted = _format_json_allocations(portfolio.region_allocations, "Region")
-			country_allocs_formatted = _format_json_allocations(portfolio.country_allocations, "Country")
-			currency_exposure_formatted = _format_json_allocations(portfolio.currency_exposure, "Currency")
-			
-			# Replace portfolio-level variables including new pre-computed analytics
-			prompt = re.sub(r'\(\(target_vs_actual_allocations\)\)', target_allocations_text, prompt)
-			prompt = re.sub(r'\(\(sector_allocations\)\)', sector_allocs_formatted, prompt)
-			prompt = re.sub(r'\(\(region_allocations\)\)', region_allocs_formatted, prompt)
-			prompt = re.sub(r'\(\(country_allocations\)\)', country_allocs_formatted, prompt)
-			prompt = re.sub(r'\(\(currency_exposure\)\)', currency_exposure_formatted, prompt)
-			prompt = re.sub(r'\(\((\w+)\)\)', lambda match: replace_variables(match, portfolio), prompt)
-			
-			holdings = frappe.get_all(
-				"CF Portfolio Holding",
-				filters={"portfolio": portfolio.name},
-				fields=["name", "security"]
-			)
+			# Replace portfolio-level variables including the pre-computed analytics;
+			# each block is only built when the prompt actually uses it
+			if '((target_vs_actual_allocations))' in prompt:
+				prompt = prompt.replace('((target_vs_actual_allocations))', _build_target_vs_actual_allocations(portfolio_name))
+			for fieldname, label in PORTFOLIO_ALLOCATION_VARIABLES:
+				placeholder = f"(({fieldname}))"
+				if placeholder in prompt:
+					prompt = prompt.replace(placeholder, _format_json_allocations(portfolio.get(fieldname), label))
+			variables_cache = {}
+			prompt = PORTFOLIO_VARIABLE_PATTERN.sub(lambda match: replace_variables(match, portfolio, variables_cache), prompt)
 			
 			if holdings:
 				# Find all ***HOLDINGS*** sections in the prompt
-				holdings_pattern = r'\*\*\*HOLDINGS\*\*\*(.*?)\*\*\*HOLDINGS\*\*\*'
-				holdings_matches = re.findall(holdings_pattern, prompt, re.DOTALL)
+				holdings_matches = HOLDINGS_SECTION_PATTERN.findall(prompt)
 				
 				if holdings_matches:
+					# Parse each section once; it is then rendered for every holding
+					compiled_sections = [compile_holdings_section(holdings_content) for holdings_content in holdings_matches]
+					
 					# Process each holding separately and create sections for each
 					all_holding_sections = []
 					
@@ -645,41 +785,18 @@ def process_portfolio_ai_analysis(portfolio_name, user):
 						holding_doc = frappe.get_doc("CF Portfolio Holding", holding_info.name)
 						security_doc = frappe.get_doc("CF Security", holding_info.security)
 						
-						# Process each ***HOLDINGS*** section for this holding
-						holding_sections = []
-						for holdings_content in holdings_matches:
-							holding_prompt = holdings_content
-							
-							# Replace {{variable}} with security fields
-							def replace_security_variables(match):
-								variable_name = match.group(1)
-								try:
-									field_value = getattr(security_doc, variable_name, None)
-									return str(field_value) if field_value is not None else ""
-								except AttributeError:
-									return match.group(0)
-							
-							# Replace [[variable]] with holding fields
-							def replace_holding_variables(match):
-								variable_name = match.group(1)
-								try:
-									field_value = getattr(holding_doc, variable_name, None)
-									return str(field_value) if field_value is not None else ""
-								except AttributeError:
-									return match.group(0)
-							
-							# Apply security and holding replacements
-							holding_prompt = re.sub(r'\{\{([\w\.]+)\}\}', lambda match: replace_variables(match, security_doc), holding_prompt)
-							holding_prompt = re.sub(r'\[\[([\w\.]+)\]\]', lambda match: replace_variables(match, holding_doc), holding_prompt)
-							
-							holding_sections.append(holding_prompt)
+						# Replace {{variable}} with security fields and [[variable]] with holding fields in each section
+						holding_sections = [
+							render_holdings_section(compiled_section, security_doc, holding_doc, variables_cache)
+							for compiled_section in compiled_sections
+						]
 						
 						# Join sections for this holding
 						all_holding_sections.append("***HOLDINGS***" + "***HOLDINGS******HOLDINGS***".join(holding_sections) + "***HOLDINGS***")
 					
 					# Replace all ***HOLDINGS*** sections in the original prompt with processed content
 					# First, get the content before first and after last ***HOLDINGS*** markers
-					parts = re.split(r'\*\*\*HOLDINGS\*\*\*.*?\*\*\*HOLDINGS\*\*\*', prompt, flags=re.DOTALL)
+					parts = HOLDINGS_SECTION_PATTERN.split(prompt)
 					
 					# Reconstruct the prompt with all holdings processed
 					final_parts = []
@@ -834,7 +951,7 @@ def process_evaluate_holdings_news(portfolio_name, user):
 		
 		try:
 			# Get OpenWebUI settings
-			settings = frappe.get_single("CF Settings")
+			settings = frappe.get_cached_doc("CF Settings")
 			client = OpenAI(api_key=settings.get_password('open_ai_api_key'), base_url=settings.open_ai_url)
 			model = settings.default_ai_model
 			if not model:
@@ -854,9 +971,28 @@ def process_evaluate_holdings_news(portfolio_name, user):
 			if not holdings:
 				raise ValueError(_('No holdings found in this portfolio'))
 			
+			# Only load securities that have news and are not already flagged for evaluation
+			candidate_securities = set(frappe.get_all(
+				"CF Security",
+				filters=[
+					["name", "in", [h.security for h in holdings if h.security]],
+					["news", "is", "set"],
+					["need_evaluation", "=", 0],
+				],
+				pluck="name"
+			))
+			
+			# Reference time for date-based tagging of headlines, offset-aware
+			current_time = frappe.utils.now_datetime()
+			if current_time.tzinfo is None:
+				current_time = current_time.replace(tzinfo=timezone.utc)
+			
 			# Filter securities that have news and need evaluation
 			securities_to_evaluate = []
 			for holding_info in holdings:
+				if holding_info.security not in candidate_securities:
+					continue  # Skip if no news or already flagged
+				
 				security_doc = frappe.get_doc("CF Security", holding_info.security)
 				
 				# Check if security has news in the JSON field
@@ -898,19 +1034,6 @@ def process_evaluate_holdings_news(portfolio_name, user):
 				
 				# Prepare headlines for this security with date-based tagging
 				headlines = []
-				current_time = frappe.utils.now_datetime()
-				
-				# Ensure current_time is offset-aware
-				if current_time.tzinfo is None:
-					current_time = current_time.replace(tzinfo=timezone.utc)
-				
-				# Keywords that indicate earnings/results announcements
-				earnings_keywords = [
-					'earnings', 'results', 'quarterly', 'annual',
-					'q1', 'q2', 'q3', 'q4', 'fy', 'fiscal',
-					'revenue', 'profit', 'loss', 'guidance',
-					'eps', 'ebitda', 'beat', 'miss'
-				]
 				
 				for news_item in news_items_to_process:
 					if isinstance(news_item, dict) and 'content' in news_item:
@@ -931,7 +1054,7 @@ def process_evaluate_holdings_news(portfolio_name, user):
 									
 									# Tag earnings headlines from last 90 days
 									title_lower = title.lower()
-									is_earnings_related = any(keyword in title_lower for keyword in earnings_keywords)
+									is_earnings_related = any(keyword in title_lower for keyword in EARNINGS_KEYWORDS)
 									
 									if days_old <= 90 and is_earnings_related:
 										headlines.append(f"[RECENT EARNINGS - {days_old}d ago] {title}")
@@ -967,110 +1090,15 @@ def process_evaluate_holdings_news(portfolio_name, user):
 				return True
 			
 			# Build the prompt with actual security data
-			prompt = """I own the following stocks that I previously evaluated based on fundamentals.  
-Analyze their recent **NEWS HEADLINES** (not full articles) for material changes that could alter valuation.
-
-⚠️ **Important**: You're analyzing headlines only, which may lack context. Be conservative - 
-when headlines are vague or could be routine, default to "No" unless clearly material.
-
-📅 **Headline Tags Explained**:
-- **[RECENT EARNINGS - Xd ago]** = Earnings/results announced within last 90 days (HIGH PRIORITY)
-- **[EARNINGS - Xd ago]** = Older earnings-related news (>90 days)
-- **[Xd ago]** = Recent non-earnings news (within 7 days)
-- No tag = Older general news
-
-### **Strict Evaluation Criteria**  
-Flag for re-evaluation **ONLY** if any of these occur:
-
-1. **Quarterly/Annual Earnings Reports**:
-	- **ANY quarterly or annual earnings release** (always material - updates valuation inputs)
-	- EPS/revenue miss/beat >5% vs. estimates (especially important)
-	- FY/quarterly guidance raised/lowered (any amount)
-	- Margin expansion/compression >200bps year-over-year
-	- Sequential revenue decline >10% (Q-over-Q)
-	- Major earnings restatements or accounting changes
-	- Management commentary on business outlook changes
-
-2. **Business Risks/Opportunities**:
-	- M&A, major partnerships, or divestitures (>$100M or >10% market cap)
-	- Product launches with >10% revenue impact potential
-	- Loss/gain of major customers (>10% revenue)
-
-3. **Financial Health Changes**:
-	- New debt/equity issuance changing capital structure >15%
-	- Credit rating downgrades (by major agencies)
-	- Cash flow warnings, liquidity crises, or covenant breaches
-	- Dividend cuts/suspensions or major buyback changes
-
-4. **Management/Legal Risks**:
-	- CEO/CFO/Chairman departure (especially unexpected)
-	- Fraud allegations, SEC investigations, or major lawsuits
-	- Criminal charges against executives
-
-5. **Strategic/Operational Changes**:
-	- Business model pivots or major restructuring
-	- Geographic expansion into major new markets
-	- Supply chain disruptions materially affecting production
-	- Facility closures or major layoffs (>10% workforce)
-
-6. **Regulatory/Political** (if applicable):
-	- FDA approvals/rejections (healthcare/pharma)
-	- Antitrust actions, regulatory bans, or license revocations
-	- Major policy changes materially affecting the business
-
-### **IGNORE These (Not Material)**
-- Routine analyst upgrades/downgrades without thesis changes
-- Minor price target adjustments (<15%)
-- General market commentary or sector trends
-- Insider trading <5% ownership or routine planned sales
-- Conference attendance or presentations
-- Awards, rankings, ESG scores, or "best company" lists
-- Stock splits or minor corporate actions
-
-### **Decision Rule**
-- When in doubt → default to **"No"** to avoid alert fatigue
-- Only flag clear, unambiguous material changes
-- If headline suggests materiality but lacks details → mark "Yes" with note
-
-**Response Format (Strict JSON Array):**
-[
-	{
-		"Company": "Company name",
-		"Symbol": "Ticker symbol",
-		"Evaluate": "Yes/No",
-		"Reasoning": "Criterion # (1-6) + one-sentence impact summary, or 'Insufficient detail in headline - requires follow-up'"
-	}
-]
-
-**Example:**
-[
-	{
-		"Company": "Acme Corp",
-		"Symbol": "ACME",
-		"Evaluate": "Yes",
-		"Reasoning": "Criterion 1: Q3 earnings beat by 8% with FY guidance raised 12%, indicating stronger-than-expected demand"
-	},
-	{
-		"Company": "Beta Inc",
-		"Symbol": "BETA",
-		"Evaluate": "No",
-		"Reasoning": "Analyst price target increase is routine, no fundamental change"
-	}
-]
-
-"""
-			
-			# Add each security's information to the prompt
+			security_sections = []
 			for item in securities_to_evaluate:
 				security_doc = item['security_doc']
-				headlines = item['headlines']
-				
-				prompt += f"*Company*: {security_doc.security_name or ''}\n"
-				prompt += f"*Symbol*: {security_doc.symbol or ''}\n"
-				prompt += "*Headlines*:\n"
-				for headline in headlines:
-					prompt += f"- {headline}\n"
-				prompt += "\n"
+				security_sections.append(NEWS_EVALUATION_SECTION.format(
+					security_name=security_doc.security_name or '',
+					symbol=security_doc.symbol or '',
+					headlines="".join(f"- {headline}\n" for headline in item['headlines'])
+				))
+			prompt = NEWS_EVALUATION_PROMPT + "".join(security_sections)
 
 			# Make the API call
 			messages = [
@@ -1096,10 +1124,19 @@ Flag for re-evaluation **ONLY** if any of these occur:
 			if not isinstance(json_content, list):
 				raise ValueError("AI response is not a valid JSON array")
 
+			# Index evaluated securities by symbol so each AI result is matched in O(1)
+			securities_by_symbol = {}
+			for eval_item in securities_to_evaluate:
+				securities_by_symbol.setdefault(eval_item['security_doc'].symbol, eval_item['security_doc'])
+
+			# All securities evaluated in this run share the same modification timestamp
+			ai_modified = frappe.utils.now_datetime().strftime('%Y-%m-%d %H:%M:%S')
+
 			# Track results for reporting
 			flagged_count = 0
 			cleared_count = 0
 			failed_saves = []
+			evaluation_errors = []
 
 			for item in json_content:
 				if not isinstance(item, dict):
@@ -1110,40 +1147,40 @@ Flag for re-evaluation **ONLY** if any of these occur:
 					raise ValueError("AI response item is missing required fields")
 				
 				# Find the security document from our evaluated securities list by symbol
-				security_found = None
-				for eval_item in securities_to_evaluate:
-					if eval_item['security_doc'].symbol == item['Symbol']:
-						security_found = eval_item['security_doc']
-						break
+				security_found = securities_by_symbol.get(item['Symbol'])
 				
 				if not security_found:
-					err_msg = f"Symbol not found in evaluated list: {item['Symbol']}"
-					frappe.log_error(message=err_msg, title="Security Not Found")
+					evaluation_errors.append(f"Symbol not found in evaluated list: {item['Symbol']}")
 					continue
 				
 				# Update security based on evaluation result
-				current_time = frappe.utils.now_datetime()
-				
 				if item['Evaluate'].lower() == 'yes':
 					# Flag for re-evaluation
 					security_found.need_evaluation = True
 					security_found.news_reasoning = item['Reasoning']
-					security_found.ai_modified = current_time.strftime('%Y-%m-%d %H:%M:%S')
+					security_found.ai_modified = ai_modified
 					flagged_count += 1
 				else:
 					# Cleared - no material changes found
 					security_found.need_evaluation = False
 					security_found.news_reasoning = f"Cleared: {item['Reasoning']}"
-					security_found.ai_modified = current_time.strftime('%Y-%m-%d %H:%M:%S')
+					security_found.ai_modified = ai_modified
 					cleared_count += 1
 				
 				try:
 					security_found.save()
 				except Exception as save_err:
-					err_msg = f"Save failed for {item['Symbol']}: {str(save_err)[:50]}..."
-					frappe.log_error(message=err_msg, title="Security Save Error")
+					frappe.logger().exception(f"Save failed for {item['Symbol']}")
+					evaluation_errors.append(f"Save failed for {item['Symbol']}: {str(save_err)[:50]}...")
 					failed_saves.append(item['Symbol'])
 
+			if evaluation_errors:
+				# One error log entry for the whole run instead of one per failing item
+				frappe.log_error(
+					message=f"Portfolio {portfolio_name}:\n" + "\n".join(evaluation_errors),
+					title="Holdings News Evaluation Errors"
+				)
+
 			frappe.db.commit()  # Single commit for all changes
 			
 			# Build success message with details
@@ -16,12 +16,43 @@ class CFPortfolioHolding(Document):
             self.ai_suggestion = ai_suggestion
 
     def validate(self):
+        # The linked security, portfolio and exchange rate are loaded once and shared by the calculations below
+        self._security_data = None
+        self._portfolio_data = None
+        self._conversion_rate = None
         self.convert_average_purchase_price()
         self.calculate_current_value()
         self.calculate_dividend_data()
         self.calculate_profit_loss()
         self.calculate_allocation_percentage()
         
+    def get_security_data(self):
+        """Fields of the linked security used by the calculations, loaded once per validation"""
+        if getattr(self, "_security_data", None) is None:
+            self._security_data = frappe.db.get_value(
+                "CF Security", self.security, ["currency", "current_price", "dividends"], as_dict=True
+            )
+        return self._security_data
+
+    def get_portfolio_data(self):
+        """Fields of the parent portfolio used by the calculations, loaded once per validation"""
+        if getattr(self, "_portfolio_data", None) is None:
+            self._portfolio_data = frappe.db.get_value(
+                "CF Portfolio", self.portfolio, ["currency", "start_date"], as_dict=True
+            )
+        return self._portfolio_data
+
+    def get_conversion_rate(self):
+        """Rate from the security currency to the portfolio currency, looked up once per validation"""
+        if getattr(self, "_conversion_rate", None) is None:
+            security = self.get_security_data()
+            portfolio = self.get_portfolio_data()
+            conversion_rate = get_exchange_rate(security.currency, portfolio.currency)
+            if security.currency.upper() == 'GBP':
+                conversion_rate = conversion_rate / 100
+            self._conversion_rate = conversion_rate
+        return self._conversion_rate
+
     def convert_average_purchase_price(self):
         """Convert average purchase price to portfolio currency if changed"""
         if self.average_purchase_price and (not self.get_doc_before_save() or 
@@ -30,13 +61,13 @@ class CFPortfolioHolding(Document):
             if not self.portfolio:
                 return
                 
-            portfolio = frappe.get_doc("CF Portfolio", self.portfolio)
+            portfolio = self.get_portfolio_data()
             
             # Get security currency
             if not self.security:
                 return
                 
-            security = frappe.get_doc("CF Security", self.security)
+            security = self.get_security_data()
             
             # If currencies are the same, no conversion needed
             if security.currency == portfolio.currency:
@@ -44,9 +75,7 @@ class CFPortfolioHolding(Document):
             else:
                 # Convert from security currency to portfolio currency
                 try:
-                    conversion_rate = get_exchange_rate(security.currency, portfolio.currency)
-                    if security.currency.upper() == 'GBP':
-                        conversion_rate = conversion_rate / 100
+                    conversion_rate = self.get_conversion_rate()
                     if conversion_rate:
                         self.base_average_purchase_price = flt(self.average_purchase_price * conversion_rate)
                 except Exception as e:
@@ -61,11 +90,8 @@ class CFPortfolioHolding(Document):
         """Calculate current value based on quantity and current price"""
 
         if self.security:
-            security = frappe.get_doc("CF Security", self.security)
-            portfolio = frappe.get_doc("CF Portfolio", self.portfolio)
-            conversion_rate = get_exchange_rate(security.currency, portfolio.currency)
-            if security.currency.upper() == 'GBP':
-                conversion_rate = conversion_rate / 100
+            security = self.get_security_data()
+            conversion_rate = self.get_conversion_rate()
             price_in_security_currency = flt(security.current_price)
             self.current_price = flt(price_in_security_currency * conversion_rate)
         else:
@@ -107,18 +133,26 @@ class CFPortfolioHolding(Document):
             
     def on_update(self):
         """Update parent portfolio when holdings change"""
-        # get all holdings for this portfolio except this one
+        # Load every holding of the portfolio once; the total includes this holding's saved value
         holdings = frappe.get_all(
             "CF Portfolio Holding",
-            filters={"portfolio": self.portfolio, "name": ["!=", self.name]},
-            fields=["name"]
+            filters={"portfolio": self.portfolio},
+            fields=["name", "current_value", "allocation_percentage"]
         )
-        # for each holding, calculate_allocation_percentage
+        total_value = sum(flt(holding.current_value) for holding in holdings)
+
+        # Recalculate the allocation percentage of the other holdings, writing only those that changed
         for holding in holdings:
-            holding_doc = frappe.get_doc("CF Portfolio Holding", holding.name)
-            allocation_percentage = holding_doc.calculate_allocation_percentage()
-            # update the holding directly
-            holding_doc.db_set("allocation_percentage", allocation_percentage)
+            if holding.name == self.name:
+                continue
+            if not holding.current_value:
+                allocation_percentage = None
+            elif total_value > 0:
+                allocation_percentage = flt((holding.current_value / total_value) * 100, 2)
+            else:
+                allocation_percentage = 0
+            if allocation_percentage != holding.allocation_percentage:
+                frappe.db.set_value("CF Portfolio Holding", holding.name, "allocation_percentage", allocation_percentage)
 
     @frappe.whitelist()
     def fetch_data(self, with_fundamentals=False):
@@ -186,14 +220,14 @@ class CFPortfolioHolding(Document):
                 self.dividend_yield = flt(ticker_data.get("dividendYield"), 2)
             
             # Get latest dividend from dividend history
-            security = frappe.get_doc("CF Security", self.security)
+            security = self.get_security_data()
             if security.dividends:
                 # get portfolio start_date
-                portfolio = frappe.get_doc("CF Portfolio", self.portfolio)
+                portfolio = self.get_portfolio_data()
                 dividends = json.loads(security.dividends) if isinstance(security.dividends, str) else security.dividends
                 if dividends:
-                    # Sort dates in descending order to get the most recent one
-                    dates = sorted(dividends.keys(), reverse=True)
+                    # Every dividend since the portfolio start date is summed, so order does not matter
+                    dates = dividends.keys()
                     if dates:
                         # Calculate total dividend income since portfolio start date
                         total_dividend_income = 0
@@ -228,9 +262,7 @@ class CFPortfolioHolding(Document):
                         # Convert total dividend income to portfolio currency if needed
                         if total_dividend_income > 0 and security.currency != portfolio.currency:
                             try:
-                                conversion_rate = get_exchange_rate(security.currency, portfolio.currency)
-                                if security.currency.upper() == 'GBP':
-                                    conversion_rate = conversion_rate / 100
+                                conversion_rate = self.get_conversion_rate()
                                 total_dividend_income = flt(total_dividend_income * conversion_rate)
                             except Exception as e:
                                 frappe.log_error(
@@ -246,6 +278,10 @@ class CFPortfolioHolding(Document):
                 "Portfolio Holding Dividend Calculation Error"
             )
 
+def on_doctype_update():
+	"""Index the (portfolio, security) pair used to look up a holding from transactions and dividends"""
+	frappe.db.add_index("CF Portfolio Holding", ["portfolio", "security"])
+
 @frappe.whitelist()
 def fetch_data_selected(docnames, with_fundamentals=False):
 	"""Fetch latest data for selected securities"""
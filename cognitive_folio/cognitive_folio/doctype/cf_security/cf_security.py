@@ -3,13 +3,17 @@
 
 import json
 import os
+from datetime import datetime
+from functools import lru_cache
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.utils import flt
 from cognitive_folio.utils.markdown import safe_markdown_to_html
-from cognitive_folio.utils.helper import replace_variables, clear_string, get_edgar_data
+from cognitive_folio.utils.helper import replace_variables, clear_string, get_edgar_data, json_loads, SECURITY_VARIABLE_PATTERN
 import re
 
 try:
@@ -18,6 +22,23 @@ try:
 except ImportError:
 	YFINANCE_INSTALLED = False
 
+# Shared session so repeated lookups reuse keep-alive connections instead of a new TLS handshake per call
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("https://", HTTPAdapter(
+	pool_connections=4,
+	pool_maxsize=10,
+	max_retries=Retry(total=2, backoff_factor=0.2)
+))
+# (connect, read) timeouts
+HTTP_TIMEOUT = (3.05, 10)
+
+# String values in an AI response and the raw control characters escaped inside them
+JSON_STRING_VALUE_PATTERN = re.compile(r'"([^"]*(?:\\.[^"]*)*)"', re.DOTALL)
+JSON_STRING_ESCAPES = str.maketrans({'\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+# Non-period columns in EDGAR statement rows
+EDGAR_METADATA_COLUMNS = frozenset({'index', 'metric', 'Metric', '', 'label', 'concept'})
+
 class CFSecurity(Document):
 	def validate(self):
 
@@ -145,7 +166,7 @@ class CFSecurity(Document):
 				if not self.cik:
 					self.fetch_cik()
 				if self.cik:
-					get_edgar_data(self.cik)
+					get_edgar_data(self.cik, refresh=True)
 				self.profit_loss = ticker.income_stmt.to_json(date_format='iso')
 				self.ttm_profit_loss = ticker.ttm_income_stmt.to_json(date_format='iso')
 				self.quarterly_profit_loss = ticker.quarterly_income_stmt.to_json(date_format='iso')
@@ -175,45 +196,14 @@ class CFSecurity(Document):
 			return {"success": False, "message": "Symbol is required to fetch CIK."}
 
 		ticker = (self.symbol or "").upper()
+
 		try:
-			import requests
-		except Exception as e:
-			return {"success": False, "message": f"requests unavailable: {e}"}
-
-		urls = [
-			"https://www.sec.gov/files/company_tickers.json",
-			"https://www.sec.gov/files/company_tickers_exchange.json",
-		]
-		headers = {
-			"User-Agent": "cognitive-folio/1.0 (support@kainotomo.com)",
-			"Accept": "application/json",
-		}
-		try:
-			for url in urls:
-				resp = requests.get(url, headers=headers, timeout=8)
-				if resp.status_code != 200:
-					continue
-				try:
-					data = resp.json()
-				except Exception:
-					continue
-				# data can be dict keyed by index or a list; normalize to iterable of entries
-				entries = []
-				if isinstance(data, dict):
-					entries = data.values()
-				elif isinstance(data, list):
-					entries = data
-				for entry in entries:
-					try:
-						symbol_value = (entry.get("ticker") or "").upper()
-						if symbol_value == ticker:
-							cik_int = entry.get("cik_str") or entry.get("cik") or entry.get("ciknumber")
-							if cik_int:
-								self.cik = str(cik_int).zfill(10)
-								self.save(ignore_permissions=True)
-								return {"success": True, "cik": self.cik}
-					except Exception:
-						continue
+			for url in SEC_TICKER_URLS:
+				cik = get_sec_ticker_map(url).get(ticker)
+				if cik:
+					self.cik = cik
+					self.save(ignore_permissions=True)
+					return {"success": True, "cik": self.cik}
 			return {"success": False, "message": "CIK not found for this symbol from SEC list."}
 		except Exception as e:
 			err_msg = f"CIK lookup failed for {self.symbol}: {str(e)}"
@@ -261,38 +251,8 @@ class CFSecurity(Document):
 	def get_financial_data_coverage(self):
 		"""Get available financial data coverage from Yahoo Finance and SEC EDGAR"""
 		try:
-			from datetime import datetime
-			
 			coverage_data = {}
 			
-			# Helper function to parse date and format it
-			def format_period(date_str):
-				"""Convert ISO date string to readable format (Q3 2024 or FY 2023)"""
-				try:
-					dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-					year = dt.year
-					month = dt.month
-					
-					# Determine quarter based on month
-					if month in [1, 2, 3]:
-						return f"Q1 {year}"
-					elif month in [4, 5, 6]:
-						return f"Q2 {year}"
-					elif month in [7, 8, 9]:
-						return f"Q3 {year}"
-					elif month in [10, 11, 12]:
-						return f"Q4 {year}"
-				except:
-					return date_str
-			
-			def format_annual_period(date_str):
-				"""Convert ISO date string to fiscal year format (FY 2023)"""
-				try:
-					dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-					return f"FY {dt.year}"
-				except:
-					return date_str
-			
 			def extract_periods_from_json(json_field, is_annual=False):
 				"""Extract period dates from a JSON field"""
 				if not json_field:
@@ -440,13 +400,10 @@ class CFSecurity(Document):
 							if isinstance(periods_list, list) and len(periods_list) > 0:
 								first_row = periods_list[0]
 								if isinstance(first_row, dict):
-									# Define metadata columns to exclude
-									metadata_columns = ['index', 'metric', 'Metric', '', 'label', 'concept']
-									
 									# Get all keys except metadata columns
 									for key in first_row.keys():
 										# Skip metadata columns
-										if key and key not in metadata_columns:
+										if key and key not in EDGAR_METADATA_COLUMNS:
 											period_dates.append(key)
 							
 							# Format the periods
@@ -551,6 +508,72 @@ class CFSecurity(Document):
 
 		return "\n".join(markdown)
 
+@lru_cache(maxsize=512)
+def format_period(date_str):
+	"""Convert ISO date string to quarter format (Q3 2024); labels repeat across calls so they are cached"""
+	try:
+		dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+		return f"Q{(dt.month - 1) // 3 + 1} {dt.year}"
+	except:
+		return date_str
+
+@lru_cache(maxsize=512)
+def format_annual_period(date_str):
+	"""Convert ISO date string to fiscal year format (FY 2023)"""
+	try:
+		dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+		return f"FY {dt.year}"
+	except:
+		return date_str
+
+SEC_TICKER_URLS = (
+	"https://www.sec.gov/files/company_tickers.json",
+	"https://www.sec.gov/files/company_tickers_exchange.json",
+)
+SEC_TICKER_CACHE_TTL = 24 * 60 * 60
+
+
+def get_sec_ticker_map(url):
+	"""Return {TICKER: zero-padded CIK} from an SEC ticker list, cached in Redis for a day"""
+	cache_key = f"cf_sec_ticker_map:{url}"
+	ticker_map = frappe.cache().get_value(cache_key)
+	if ticker_map is not None:
+		return ticker_map
+
+	headers = {
+		"User-Agent": "cognitive-folio/1.0 (support@kainotomo.com)",
+		"Accept": "application/json",
+	}
+	resp = _HTTP_SESSION.get(url, headers=headers, timeout=(3.05, 8))
+	if resp.status_code != 200:
+		return {}
+	try:
+		# Parse the raw bytes directly instead of decoding the multi-MB body to text first
+		data = json_loads(resp.content)
+	except Exception:
+		return {}
+
+	# data can be dict keyed by index or a list; normalize to iterable of entries
+	entries = []
+	if isinstance(data, dict):
+		entries = data.values()
+	elif isinstance(data, list):
+		entries = data
+
+	ticker_map = {}
+	for entry in entries:
+		try:
+			symbol_value = (entry.get("ticker") or "").upper()
+			cik_int = entry.get("cik_str") or entry.get("cik") or entry.get("ciknumber")
+			if symbol_value and cik_int:
+				# Keep the first listing for a ticker, matching a top-down scan of the file
+				ticker_map.setdefault(symbol_value, str(cik_int).zfill(10))
+		except Exception:
+			continue
+
+	frappe.cache().set_value(cache_key, ticker_map, expires_in_sec=SEC_TICKER_CACHE_TTL)
+	return ticker_map
+
 @frappe.whitelist()
 def search_stock_symbols(search_term):
 	"""Search for stock symbols based on company name or symbol"""
@@ -562,7 +585,7 @@ def search_stock_symbols(search_term):
 		url = f"https://query2.finance.yahoo.com/v1/finance/search?q={search_term}&quotesCount=10"
 
 		headers = {'User-Agent': 'Mozilla/5.0'}
-		response = requests.get(url, headers=headers)
+		response = _HTTP_SESSION.get(url, headers=headers, timeout=HTTP_TIMEOUT)
 		data = response.json()
 		
 		if "quotes" in data:
@@ -589,7 +612,7 @@ def get_country_region_from_api(country):
 	country_code = frappe.get_value("Country", {"country_name": country}, "code")
 
 	try:
-		response = requests.get(f"https://restcountries.com/v3.1/alpha/{country_code}")
+		response = _HTTP_SESSION.get(f"https://restcountries.com/v3.1/alpha/{country_code}", timeout=HTTP_TIMEOUT)
 		if response.status_code == 200:
 			data = response.json()
 			if data and len(data) > 0:
@@ -629,7 +652,7 @@ def process_security_ai_suggestion(security_name, user):
 		
 		try:
 			# Get OpenWebUI settings
-			settings = frappe.get_single("CF Settings")
+			settings = frappe.get_cached_doc("CF Settings")
 			client = OpenAI(api_key=settings.get_password('open_ai_api_key'), base_url=settings.open_ai_url)
 			
 			# Use default AI model from settings instead of hardcoded value
@@ -638,7 +661,9 @@ def process_security_ai_suggestion(security_name, user):
 			prompt = security.ai_prompt or ""
 
 			# Update regex to handle more complex paths including array indices
-			prompt = re.sub(r'\{\{([\w\.]+)\}\}', lambda match: replace_variables(match, security), prompt)
+			# One cache for the whole prompt so each JSON field is parsed once, however many variables read it
+			variables_cache = {}
+			prompt = SECURITY_VARIABLE_PATTERN.sub(lambda match: replace_variables(match, security, variables_cache), prompt)
 			
 			messages = [
 				{"role": "system", "content": settings.system_content},
@@ -702,19 +727,13 @@ def process_security_ai_suggestion(security_name, user):
 				
 				# Find all string values in the JSON and clean them
 				def clean_json_string(match):
-					string_content = match.group(1)
-					# Replace literal newlines with \n
-					string_content = string_content.replace('\n', '\\n')
-					# Replace other problematic characters
-					string_content = string_content.replace('\r', '\\r')
-					string_content = string_content.replace('\t', '\\t')
+					# Escape literal newlines, carriage returns and tabs in one pass
+					string_content = match.group(1).translate(JSON_STRING_ESCAPES)
 					string_content = string_content.replace('&nbsp;', ' ')
-					# Handle unescaped quotes within strings
-					string_content = re.sub(r'(?<!\\)"', '\\"', string_content)
 					return f'"{string_content}"'
 				
 				# Apply cleaning to all JSON string values
-				cleaned = re.sub(r'"([^"]*(?:\\.[^"]*)*)"', clean_json_string, cleaned, flags=re.DOTALL)
+				cleaned = JSON_STRING_VALUE_PATTERN.sub(clean_json_string, cleaned)
 				
 				suggestion = json.loads(cleaned)
 				
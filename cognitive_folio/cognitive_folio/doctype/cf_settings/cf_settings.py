@@ -5,7 +5,22 @@ import frappe
 from frappe.model.document import Document
 import requests
 from urllib.parse import urljoin
-import json
+
+# Shared HTTP client for the OpenAI SDK, created on first use so connections are reused across checks
+_http_client = None
+
+
+def get_openai_http_client():
+	"""Return a process-wide httpx client with keep-alive pooling and staged timeouts"""
+	global _http_client
+	if _http_client is None:
+		import httpx
+
+		_http_client = httpx.Client(
+			limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=30),
+			timeout=httpx.Timeout(connect=3, read=10, write=5, pool=5)
+		)
+	return _http_client
 
 class CFSettings(Document):
 	@frappe.whitelist()
@@ -18,7 +33,11 @@ class CFSettings(Document):
 			return 0
 		
 		try:
-			client = OpenAI(api_key=self.get_password('open_ai_api_key'), base_url=self.open_ai_url)
+			client = OpenAI(
+				api_key=self.get_password('open_ai_api_key'),
+				base_url=self.open_ai_url,
+				http_client=get_openai_http_client()
+			)
 			response = client.models.list()
 			self.update_ai_models(response.data)
 			self.save()
@@ -1,29 +1,26 @@
 # Copyright (c) 2025, YourCompany and contributors
 # For license information, please see license.txt
 
+from collections import defaultdict
+
 import frappe
 from frappe.model.document import Document
 
 
 class CFTransaction(Document):
     def validate(self):
-        self.calculate_total_amount()
-        self.calculate_total_fees()
+        # Bulk importers that already computed totals can set this flag to skip recalculation
+        if self.flags.ignore_calculate_totals:
+            return
+        self.calculate_totals()
         
-    def calculate_total_amount(self):
-        """Calculate total amount based on quantity and price per unit"""
-        if self.quantity and self.price_per_unit:
-            self.total_amount = self.quantity * self.price_per_unit
-            
-    def calculate_total_fees(self):
-        """Calculate total fees (sum of fees and commission)"""
-        total = 0
-        if self.fees:
-            total += self.fees
-        if self.commission:
-            total += self.commission
+    def calculate_totals(self):
+        """Calculate total amount (quantity x price per unit) and total fees (fees + commission)"""
+        quantity, price_per_unit = self.quantity, self.price_per_unit
+        if quantity and price_per_unit:
+            self.total_amount = quantity * price_per_unit
         
-        self.total_fees = total
+        self.total_fees = (self.fees or 0) + (self.commission or 0)
         
     def on_submit(self):
         """When a transaction is submitted, update the portfolio holding"""
@@ -35,30 +32,11 @@ class CFTransaction(Document):
         
     def update_portfolio_holding(self, cancel=False):
         """Update portfolio holding based on this transaction"""
-        if not frappe.db.table_exists("CF Portfolio Holding"):
-            return
-            
-        # Find if a holding already exists for this portfolio-security combination
-        holding = frappe.get_all(
-            "CF Portfolio Holding",
-            filters={
-                "portfolio": self.portfolio,
-                "security": self.security
-            },
-            fields=["name", "quantity", "average_purchase_price"]
-        )
-        
-        multiplier = -1 if cancel else 1
-        
-        if self.transaction_type == "Buy":
-            self.process_buy_transaction(holding, multiplier)
-        elif self.transaction_type == "Sell":
-            self.process_sell_transaction(holding, multiplier)
-        # Additional transaction types can be handled here
+        update_portfolio_holdings([self], cancel=cancel)
         
-    def process_buy_transaction(self, existing_holdings, multiplier=1):
-        """Process a buy transaction and update portfolio holdings"""
-        if not existing_holdings:
+    def process_buy_transaction(self, holding, multiplier=1):
+        """Apply a buy transaction to the holding and return the updated (possibly new) holding, or None once cancelled to zero"""
+        if not holding:
             # Create a new holding if one doesn't exist
             if multiplier > 0:  # Only create on actual submission, not on cancellation
                 holding = frappe.get_doc({
@@ -68,17 +46,17 @@ class CFTransaction(Document):
                     "quantity": self.quantity,
                     "average_purchase_price": self.price_per_unit
                 })
-                holding.insert()
-            return
+            return holding
             
-        # Update existing holding
-        holding = frappe.get_doc("CF Portfolio Holding", existing_holdings[0].name)
-        
         # Calculate new average purchase price and quantity
         old_quantity = holding.quantity
         old_value = old_quantity * holding.average_purchase_price
         
         new_quantity = old_quantity + (self.quantity * multiplier)
+        if new_quantity == 0 and multiplier < 0:
+            # Cancelling the buy that makes up the whole position removes the holding,
+            # as selling the whole position does
+            return None
         if new_quantity <= 0:
             frappe.throw("Transaction would result in negative holdings. Please check the quantity.")
             
@@ -87,16 +65,13 @@ class CFTransaction(Document):
         # Update the holding
         holding.quantity = new_quantity
         holding.average_purchase_price = new_value / new_quantity if new_quantity > 0 else 0
-        holding.save()
+        return holding
         
-    def process_sell_transaction(self, existing_holdings, multiplier=1):
-        """Process a sell transaction and update portfolio holdings"""
-        if not existing_holdings:
+    def process_sell_transaction(self, holding, multiplier=1):
+        """Apply a sell transaction to the holding and return it, or None once it is fully sold"""
+        if not holding:
             frappe.throw("Cannot sell securities that are not in the portfolio")
             
-        # Update existing holding
-        holding = frappe.get_doc("CF Portfolio Holding", existing_holdings[0].name)
-        
         # Calculate new quantity
         new_quantity = holding.quantity - (self.quantity * multiplier)
         
@@ -104,9 +79,65 @@ class CFTransaction(Document):
             frappe.throw("Cannot sell more securities than available in the portfolio")
             
         if new_quantity == 0:
-            # Delete the holding if quantity becomes zero
-            frappe.delete_doc("CF Portfolio Holding", holding.name)
+            # The holding is removed once quantity becomes zero
+            return None
+            
+        # Update the holding quantity (average price remains unchanged for sells)
+        holding.quantity = new_quantity
+        return holding
+
+
+def update_portfolio_holdings(transactions, cancel=False):
+    """Apply transactions to their portfolio holdings, writing each affected holding once.
+
+    Transactions are grouped by (portfolio, security) and replayed in order against the
+    loaded holding, so a batch of N transactions on the same security costs one read and
+    one write instead of N of each.
+    """
+    if not frappe.db.table_exists("CF Portfolio Holding"):
+        return
+        
+    multiplier = -1 if cancel else 1
+    
+    transactions_by_holding = defaultdict(list)
+    for transaction in transactions:
+        if transaction.transaction_type in ("Buy", "Sell"):
+            transactions_by_holding[(transaction.portfolio, transaction.security)].append(transaction)
+        # Additional transaction types can be handled here
+        
+    for (portfolio, security), holding_transactions in transactions_by_holding.items():
+        # Find if a holding already exists for this portfolio-security combination; only the
+        # columns needed for the arithmetic are read, the document is loaded just before saving
+        stored_holding = frappe.db.get_value(
+            "CF Portfolio Holding",
+            {
+                "portfolio": portfolio,
+                "security": security
+            },
+            ["name", "quantity", "average_purchase_price"],
+            as_dict=True
+        )
+        holding = stored_holding
+        
+        for transaction in holding_transactions:
+            if transaction.transaction_type == "Buy":
+                holding = transaction.process_buy_transaction(holding, multiplier)
+            else:
+                holding = transaction.process_sell_transaction(holding, multiplier)
+                
+        # Delete the stored holding by name if it was sold out (even if re-bought later in the batch)
+        if stored_holding and holding is not stored_holding:
+            frappe.delete_doc("CF Portfolio Holding", stored_holding.name)
+            
+        if holding is None:
+            continue
+            
+        if holding is stored_holding:
+            # Saved through the document so holding validators refresh base cost,
+            # current value and allocation
+            holding_doc = frappe.get_doc("CF Portfolio Holding", stored_holding.name)
+            holding_doc.quantity = holding.quantity
+            holding_doc.average_purchase_price = holding.average_purchase_price
+            holding_doc.save()
         else:
-            # Update the holding quantity (average price remains unchanged for sells)
-            holding.quantity = new_quantity
-            holding.save()
+            holding.insert()
@@ -1,9 +1,156 @@
 # Copyright (c) 2025, KAINOTOMO PH LTD and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now
+
+from cognitive_folio.cognitive_folio.doctype.cf_transaction.cf_transaction import update_portfolio_holdings
+
+TEST_SECURITY = "_TEST-CF-TXN"
+
+
+def insert_without_hooks(doc, name):
+	"""Insert a fixture directly, skipping hooks such as the security's market data fetch"""
+	doc.name = name
+	doc.owner = doc.modified_by = "Administrator"
+	doc.creation = doc.modified = now()
+	doc.db_insert()
+	return doc
 
 
 class TestCFTransaction(FrappeTestCase):
-	pass
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		if not frappe.db.exists("CF Security", TEST_SECURITY):
+			insert_without_hooks(
+				frappe.get_doc({
+					"doctype": "CF Security",
+					"security_name": "Test CF Transaction Security",
+					"symbol": TEST_SECURITY,
+					"security_type": "Stock",
+					"currency": "USD",
+					"current_price": 100,
+				}),
+				TEST_SECURITY,
+			)
+
+	def make_portfolio(self):
+		name = f"_Test CF Portfolio {frappe.generate_hash(length=8)}"
+		insert_without_hooks(
+			frappe.get_doc({
+				"doctype": "CF Portfolio",
+				"portfolio_name": name,
+				"currency": "USD",
+				"start_date": "2024-01-01",
+				"risk_profile": "Medium",
+			}),
+			name,
+		)
+		return name
+
+	def make_transactions(self, portfolio, rows):
+		"""Unsaved transactions from (transaction type, quantity, price per unit) rows"""
+		transactions = []
+		for transaction_type, quantity, price_per_unit in rows:
+			transaction = frappe.get_doc({
+				"doctype": "CF Transaction",
+				"portfolio": portfolio,
+				"security": TEST_SECURITY,
+				"transaction_type": transaction_type,
+				"quantity": quantity,
+				"price_per_unit": price_per_unit,
+			})
+			transaction.calculate_totals()
+			transactions.append(transaction)
+		return transactions
+
+	def apply_one_at_a_time(self, transactions, cancel=False):
+		"""Reference path: every transaction reads and writes the holding on its own"""
+		for transaction in transactions:
+			transaction.update_portfolio_holding(cancel=cancel)
+
+	def get_holding(self, portfolio):
+		return frappe.db.get_value(
+			"CF Portfolio Holding",
+			{"portfolio": portfolio, "security": TEST_SECURITY},
+			["quantity", "average_purchase_price", "base_cost"],
+			as_dict=True,
+		)
+
+	def assertHolding(self, portfolio, quantity, average_purchase_price):
+		holding = self.get_holding(portfolio)
+		self.assertAlmostEqual(holding.quantity, quantity, places=6)
+		self.assertAlmostEqual(holding.average_purchase_price, average_purchase_price, places=6)
+		self.assertAlmostEqual(holding.base_cost, quantity * average_purchase_price, places=2)
+
+	def assertSameHolding(self, batch_portfolio, reference_portfolio):
+		batch_holding = self.get_holding(batch_portfolio)
+		reference_holding = self.get_holding(reference_portfolio)
+		if reference_holding is None:
+			self.assertIsNone(batch_holding)
+			return
+		for fieldname in ("quantity", "average_purchase_price", "base_cost"):
+			self.assertAlmostEqual(batch_holding[fieldname], reference_holding[fieldname], places=6)
+
+	def test_buys_and_sells_of_one_security_in_one_batch(self):
+		rows = [("Buy", 10, 100), ("Buy", 5, 130), ("Sell", 6, 150), ("Buy", 4, 90)]
+		batch_portfolio, reference_portfolio = self.make_portfolio(), self.make_portfolio()
+
+		update_portfolio_holdings(self.make_transactions(batch_portfolio, rows))
+		self.apply_one_at_a_time(self.make_transactions(reference_portfolio, rows))
+
+		# 15 units cost 1650 (average 110); 9 remain after the sell, then 4 are bought for 360
+		self.assertHolding(batch_portfolio, 13, 1350 / 13)
+		self.assertSameHolding(batch_portfolio, reference_portfolio)
+
+	def test_sell_out_and_rebuy_in_one_batch(self):
+		batch_portfolio, reference_portfolio = self.make_portfolio(), self.make_portfolio()
+		for portfolio in (batch_portfolio, reference_portfolio):
+			update_portfolio_holdings(self.make_transactions(portfolio, [("Buy", 5, 100)]))
+
+		rows = [("Sell", 5, 120), ("Buy", 2, 80)]
+		update_portfolio_holdings(self.make_transactions(batch_portfolio, rows))
+		self.apply_one_at_a_time(self.make_transactions(reference_portfolio, rows))
+
+		self.assertHolding(batch_portfolio, 2, 80)
+		self.assertSameHolding(batch_portfolio, reference_portfolio)
+		self.assertEqual(frappe.db.count("CF Portfolio Holding", {"portfolio": batch_portfolio}), 1)
+
+	def test_cancel_to_zero_deletes_holding(self):
+		rows = [("Buy", 10, 100), ("Buy", 5, 130), ("Sell", 5, 150)]
+		batch_portfolio, reference_portfolio = self.make_portfolio(), self.make_portfolio()
+		batch_transactions = self.make_transactions(batch_portfolio, rows)
+		reference_transactions = self.make_transactions(reference_portfolio, rows)
+
+		update_portfolio_holdings(batch_transactions)
+		self.apply_one_at_a_time(reference_transactions)
+		self.assertHolding(batch_portfolio, 10, 110)
+		self.assertSameHolding(batch_portfolio, reference_portfolio)
+
+		# Cancelling in reverse order restores 15 units, then 10 at 100, then nothing
+		update_portfolio_holdings(list(reversed(batch_transactions)), cancel=True)
+		self.apply_one_at_a_time(list(reversed(reference_transactions)), cancel=True)
+
+		self.assertIsNone(self.get_holding(batch_portfolio))
+		self.assertIsNone(self.get_holding(reference_portfolio))
+
+	def test_batch_spanning_two_portfolios(self):
+		first_rows = [("Buy", 10, 100), ("Sell", 4, 120)]
+		second_rows = [("Buy", 3, 50), ("Buy", 1, 70)]
+		batch_portfolios = self.make_portfolio(), self.make_portfolio()
+		reference_portfolios = self.make_portfolio(), self.make_portfolio()
+
+		# Interleave the two portfolios' transactions in a single batch
+		first_batch = self.make_transactions(batch_portfolios[0], first_rows)
+		second_batch = self.make_transactions(batch_portfolios[1], second_rows)
+		update_portfolio_holdings([first_batch[0], second_batch[0], first_batch[1], second_batch[1]])
+
+		self.apply_one_at_a_time(self.make_transactions(reference_portfolios[0], first_rows))
+		self.apply_one_at_a_time(self.make_transactions(reference_portfolios[1], second_rows))
+
+		self.assertHolding(batch_portfolios[0], 6, 100)
+		self.assertHolding(batch_portfolios[1], 4, 55)
+		for batch_portfolio, reference_portfolio in zip(batch_portfolios, reference_portfolios):
+			self.assertSameHolding(batch_portfolio, reference_portfolio)
@@ -1,3 +1,4 @@
+import importlib.util
 import subprocess
 import frappe
 import sys
@@ -18,31 +19,37 @@ def install_dependencies():
     
     print("Starting Cognitive Folio dependency installation", "Cognitive Folio Setup")
     
-    # Install each dependency
+    # Skip packages that are already importable so pip is only invoked when needed
+    missing = [package for package in dependencies if importlib.util.find_spec(package) is None]
     for package in dependencies:
+        if package not in missing:
+            print(f"✓ {package} already installed", "Cognitive Folio Setup")
+    
+    if missing:
         try:
             # Show installation progress
-            print(f"Installing {package}...", "Cognitive Folio Setup")
+            print(f"Installing {', '.join(missing)}...", "Cognitive Folio Setup")
             
-            # Install using bench pip 
+            # Install all missing packages with a single bench pip call so pip resolves them in one pass
             result = subprocess.run(
-                ["bench", "pip", "install", "--quiet", package],
+                ["bench", "pip", "install", "--quiet", *missing],
                 check=False,
                 capture_output=True,
                 text=True
             )
             
             if result.returncode == 0:
-                print(f"✓ {package} installed successfully", "Cognitive Folio Setup")
+                for package in missing:
+                    print(f"✓ {package} installed successfully", "Cognitive Folio Setup")
             else:
                 print(
-                    f"✗ Failed to install {package}: {result.stderr}",
+                    f"✗ Failed to install {', '.join(missing)}: {result.stderr}",
                     "Cognitive Folio Setup Error"
                 )
                 
         except Exception as e:
             print(
-                f"✗ Error installing {package}: {str(e)}", 
+                f"✗ Error installing {', '.join(missing)}: {str(e)}", 
                 "Cognitive Folio Setup Error"
             )
     
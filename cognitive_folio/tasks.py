@@ -1,16 +1,22 @@
 # Copyright (c) 2025, KAINOTOMO PH LTD and contributors
 # For license information, please see license.txt
 
+from collections import defaultdict
+
 import frappe
 from frappe import _
+from cognitive_folio.cognitive_folio.doctype.cf_portfolio.cf_portfolio import fetch_portfolio_holdings_data, enqueue_holdings_news_evaluation
 
 @frappe.whitelist()
 def auto_fetch_portfolio_prices():
 	"""
 	Scheduled task to automatically fetch holdings data for portfolios with auth_fetch_prices enabled.
-	Runs daily at 3:00 AM.
+	Runs daily at 3:00 AM. Each portfolio is fetched in its own background job so workers
+	process them concurrently instead of one after another.
 	"""
 	try:
+		from frappe.utils.background_jobs import enqueue
+		
 		# Get all portfolios with auth_fetch_prices enabled and not disabled
 		portfolios = frappe.get_all(
 			"CF Portfolio",
@@ -25,52 +31,74 @@ def auto_fetch_portfolio_prices():
 			frappe.logger().info("No portfolios found with auto fetch prices enabled")
 			return
 		
-		total_portfolios = len(portfolios)
-		updated_portfolios = 0
+		# Get the stock holdings of all these portfolios in one query and group their securities per portfolio
+		securities_by_portfolio = defaultdict(list)
+		for portfolio_name, security in frappe.get_all(
+			"CF Portfolio Holding",
+			filters=[
+				["portfolio", "in", [p.name for p in portfolios]],
+				["security_type", "=", "Stock"]
+			],
+			fields=["portfolio", "security"],
+			as_list=True
+		):
+			securities_by_portfolio[portfolio_name].append(security)
 		
-		frappe.logger().info(f"Starting auto price fetch for {total_portfolios} portfolios")
+		frappe.logger().info(f"Queueing auto price fetch for {len(portfolios)} portfolios")
 		
 		for portfolio in portfolios:
+			securities = securities_by_portfolio.get(portfolio.name)
+			if not securities:
+				frappe.logger().info(f"No holdings to update for portfolio: {portfolio.portfolio_name}")
+				continue
+			
+			enqueue(
+				method="cognitive_folio.tasks.fetch_portfolio_prices",
+				queue="long",
+				timeout=1800,  # 30 minutes
+				job_id=f"auto_fetch_portfolio_prices_{portfolio.name}_{frappe.utils.now()}",
+				now=False,
+				portfolio_name=portfolio.name,
+				portfolio_title=portfolio.portfolio_name,
+				securities=securities
+			)
+		
+	except Exception as e:
+		frappe.log_error(
+			f"Error in auto_fetch_portfolio_prices scheduled task: {str(e)}",
+			"Auto Fetch Portfolio Prices Task Error"
+		)
+
+def fetch_portfolio_prices(portfolio_name, portfolio_title=None, securities=None):
+	"""Fetch holdings data for one portfolio and queue its news evaluation (meant to be run as a background job)"""
+	portfolio_title = portfolio_title or portfolio_name
+	
+	try:
+		# Fetch holdings data without fundamentals; a failing security is rolled back on its own
+		# so the rest of the portfolio is still committed below
+		result = fetch_portfolio_holdings_data(portfolio_name, with_fundamentals=False, securities=securities, ignore_errors=True)
+		
+		if result and result > 0:
+			frappe.logger().info(f"Successfully updated {result} holdings for portfolio: {portfolio_title}")
+			
+			# After successful price fetch, run news evaluation
 			try:
-				# Get the portfolio document
-				portfolio_doc = frappe.get_doc("CF Portfolio", portfolio.name)
-				
-				# Call the fetch_holdings_data method without fundamentals
-				result = portfolio_doc.fetch_holdings_data(with_fundamentals=False)
-				
-				if result and result > 0:
-					updated_portfolios += 1
-					frappe.logger().info(f"Successfully updated {result} holdings for portfolio: {portfolio.portfolio_name}")
-					
-					# After successful price fetch, run news evaluation
-					try:
-						frappe.logger().info(f"Starting news evaluation for portfolio: {portfolio.portfolio_name}")
-						portfolio_doc.evaluate_holdings_news()
-						frappe.logger().info(f"News evaluation queued for portfolio: {portfolio.portfolio_name}")
-					except Exception as news_error:
-						frappe.log_error(
-							f"Error running news evaluation for portfolio {portfolio.portfolio_name}: {str(news_error)}",
-							"Auto News Evaluation Error"
-						)
-						# Continue with other portfolios even if news evaluation fails
-						continue
-				else:
-					frappe.logger().info(f"No holdings to update for portfolio: {portfolio.portfolio_name}")
-					
-			except Exception as e:
+				frappe.logger().info(f"Starting news evaluation for portfolio: {portfolio_title}")
+				enqueue_holdings_news_evaluation(portfolio_name, frappe.session.user)
+				frappe.logger().info(f"News evaluation queued for portfolio: {portfolio_title}")
+			except Exception as news_error:
 				frappe.log_error(
-					f"Error fetching prices for portfolio {portfolio.portfolio_name}: {str(e)}",
-					"Auto Fetch Portfolio Prices Error"
+					f"Error running news evaluation for portfolio {portfolio_title}: {str(news_error)}",
+					"Auto News Evaluation Error"
 				)
-				continue
-		
-		frappe.logger().info(f"Auto price fetch completed. Updated {updated_portfolios} out of {total_portfolios} portfolios")
+		else:
+			frappe.logger().info(f"No holdings to update for portfolio: {portfolio_title}")
 		
 		# Commit the changes
 		frappe.db.commit()
 		
 	except Exception as e:
 		frappe.log_error(
-			f"Error in auto_fetch_portfolio_prices scheduled task: {str(e)}",
-			"Auto Fetch Portfolio Prices Task Error"
+			f"Error fetching prices for portfolio {portfolio_title}: {str(e)}",
+			"Auto Fetch Portfolio Prices Error"
 		)
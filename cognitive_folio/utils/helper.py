@@ -1,9 +1,96 @@
 import json
+import math
 import re
 import os
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 import frappe
 
+try:
+    import orjson
+    ORJSON_INSTALLED = True
+except ImportError:
+    ORJSON_INSTALLED = False
+
+
+def json_loads(data):
+    """
+    Parse JSON from str or bytes, using orjson when it is installed.
+    Input orjson rejects but the stdlib accepts (e.g. NaN written by frappe.as_json) falls back to json.loads.
+    """
+    if ORJSON_INSTALLED:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def json_dumps(obj, indent=False):
+    """
+    Serialize obj to a JSON string, using orjson when it is installed.
+    numpy values and non-string keys (as found in pandas output) are handled natively by orjson;
+    anything it still rejects falls back to json.dumps, which is made to emit the same JSON:
+    NaN and infinity become null, numpy values become plain numbers and lists, and dates are
+    written in ISO format. Values neither can encode are written as strings.
+    """
+    if ORJSON_INSTALLED:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_json_default, option=option).decode()
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(
+        _json_sanitize(obj), indent=2 if indent else None, default=_json_default, allow_nan=False
+    )
+
+
+def _json_default(value):
+    """Encode values the JSON encoders do not support natively, the way orjson does."""
+    if hasattr(value, 'tolist'):
+        # numpy scalars and arrays
+        return _json_sanitize(value.tolist())
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _json_sanitize(obj):
+    """Replace NaN and infinity with None and make dict keys encodable, as orjson does."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {_json_key(key): _json_sanitize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_sanitize(value) for value in obj]
+    return obj
+
+
+def _json_key(key):
+    """Return a dict key json.dumps accepts, rendering dates in ISO format like OPT_NON_STR_KEYS."""
+    if key is None or isinstance(key, (str, int, float, bool)):
+        return key
+    if hasattr(key, 'isoformat'):
+        return key.isoformat()
+    return str(key)
+
+
+# Prompt placeholders resolved by replace_variables: ((portfolio field)), {{security field}}, [[holding field]]
+PORTFOLIO_VARIABLE_PATTERN = re.compile(r'\(\((\w+)\)\)')
+SECURITY_VARIABLE_PATTERN = re.compile(r'\{\{([\w\.]+)\}\}')
+HOLDING_VARIABLE_PATTERN = re.compile(r'\[\[([\w\.]+)\]\]')
+
+# ***HOLDINGS***...***HOLDINGS*** prompt sections repeated once per holding
+HOLDINGS_SECTION_PATTERN = re.compile(r'\*\*\*HOLDINGS\*\*\*(.*?)\*\*\*HOLDINGS\*\*\*', re.DOTALL)
+
+# Marker for JSON fields that failed to parse
+_INVALID_JSON = object()
+
+
 def _handle_wildcard_pattern(data, path_parts):
     """
     Handle wildcard patterns like *.content.title to extract values from all array items
@@ -16,167 +103,220 @@ def _handle_wildcard_pattern(data, path_parts):
     remaining_parts = path_parts[1:]
     
     if current_part == 'ARRAY':
-        # Wildcard - process all items in the current data
+        # Wildcard - process all items in the current data (or all values of a dict)
         if isinstance(data, list):
-            results = []
-            for item in data:
-                if remaining_parts:
-                    # Continue processing the remaining path
-                    result = _navigate_nested_path(item, remaining_parts)
-                    if result is not None and result != "":
-                        results.append(str(result))
-                else:
-                    # No more path parts, add the item itself
-                    if item is not None:
-                        results.append(str(item))
-            return ", ".join(results)
+            items = data
         elif isinstance(data, dict):
-            # If it's a dict, process all values
-            results = []
-            for value in data.values():
-                if remaining_parts:
-                    result = _navigate_nested_path(value, remaining_parts)
-                    if result is not None and result != "":
-                        results.append(str(result))
-                else:
-                    if value is not None:
-                        results.append(str(value))
-            return ", ".join(results)
+            items = data.values()
         else:
             return ""
+
+        if not remaining_parts:
+            # Terminal wildcard, join the items themselves
+            return ", ".join(str(item) for item in items if item is not None)
+
+        # Compile the remaining path once and follow it for every item, skipping missing values
+        steps = _compile_path(remaining_parts)
+        results = (_follow_compiled_path(item, steps) for item in items)
+        return ", ".join(str(result) for result in results if result is not None and result != "")
     else:
         # Regular path part
         return _navigate_nested_path(data, path_parts)
 
-def _navigate_nested_path(data, path_parts):
+def _compile_path(path_parts):
     """
-    Navigate through a nested path without wildcards
+    Pre-convert path parts into (key, index) steps; index is None for parts that are not plain digits
     """
+    return tuple((part, int(part) if part.isdecimal() else None) for part in path_parts)
+
+def _follow_compiled_path(data, steps):
+    """
+    Follow compiled path steps through nested dicts and lists, returning None when the path breaks
+    """
+    # isinstance, not exact type checks: values hydrated on the doc in memory may be
+    # frappe._dict, OrderedDict or other dict/list subclasses rather than parsed JSON
     current_data = data
-    for part in path_parts:
+    for key, index in steps:
         if isinstance(current_data, dict):
-            current_data = current_data.get(part)
+            current_data = current_data.get(key)
         elif isinstance(current_data, list):
-            try:
-                index = int(part)
-                if 0 <= index < len(current_data):
-                    current_data = current_data[index]
-                else:
-                    current_data = None
-            except ValueError:
-                current_data = None
-                break
+            if index is None or not 0 <= index < len(current_data):
+                return None
+            current_data = current_data[index]
         else:
-            current_data = None
-            break
+            return None
     
     return current_data
 
-def replace_variables(match, doc):
+def _navigate_nested_path(data, path_parts):
+    """
+    Navigate through a nested path without wildcards
+    """
+    return _follow_compiled_path(data, _compile_path(path_parts))
+
+def _get_field_json(doc, field_name, field_value, cache=None):
+    """
+    Parse a JSON document field, returning _INVALID_JSON if it does not parse or is not
+    a JSON object or array. With a cache dict the result is stored per (doctype, name, field) and reused.
+    """
+    if cache is not None:
+        key = (doc.doctype, doc.name, field_name)
+        if key in cache:
+            return cache[key]
+
+    if isinstance(field_value, (dict, list)):
+        # Already hydrated, e.g. set on the document in memory
+        json_data = field_value
+    elif not isinstance(field_value, str) or field_value.lstrip()[:1] not in ('{', '['):
+        # Scalars have no nested paths to follow, so skip the parse attempt
+        json_data = _INVALID_JSON
+    else:
+        try:
+            json_data = json_loads(field_value)
+        except json.JSONDecodeError:
+            json_data = _INVALID_JSON
+
+    if cache is not None:
+        cache[key] = json_data
+    return json_data
+
+def replace_variables(match, doc, cache=None):
+    """
+    Resolve a ((field)), {{field}} or [[field.path]] match against doc.
+    Pass the same cache dict for every replacement in a prompt so each JSON field is parsed
+    and each nested variable resolved only once.
+    """
     variable_name = match.group(1)
+    if '.' not in variable_name:
+        # Plain doc field variables, by far the most common, need no JSON handling
+        field_value = getattr(doc, variable_name, None)
+        return "" if field_value is None else str(field_value)
+
+    if cache is not None:
+        value_key = ("value", doc.doctype, doc.name, variable_name)
+        if value_key in cache:
+            return cache[value_key]
+        value = _resolve_nested_variable(match, doc, variable_name, cache)
+        cache[value_key] = value
+        return value
+
+    return _resolve_nested_variable(match, doc, variable_name, cache)
+
+@lru_cache(maxsize=256)
+def _parse_variable_path(variable_name):
+    """
+    Split a dotted variable into (field name, nested path, compiled steps); steps is None for ARRAY wildcards.
+    Cached, since the same variables recur across prompts and holdings.
+    """
+    field_name, *nested_path = variable_name.split('.')
+    nested_path = tuple(nested_path)
+    steps = None if 'ARRAY' in nested_path else _compile_path(nested_path)
+    return field_name, nested_path, steps
+
+def _resolve_nested_variable(match, doc, variable_name, cache):
+    """Resolve a dotted variable such as {{field_name.key}} against a JSON field of doc"""
     try:
-        
         # Handle nested JSON variables like {{field_name.key}} or {{field_name.0.key}} for arrays
-        if '.' in variable_name:
-            parts = variable_name.split('.')
-            field_name = parts[0]
-            nested_path = parts[1:]  # Remaining path parts
+        field_name, nested_path, steps = _parse_variable_path(variable_name)
+        
+        field_value = getattr(doc, field_name, None)
+        if field_value:
+            # Try to parse as JSON
+            json_data = _get_field_json(doc, field_name, field_value, cache)
+            if json_data is _INVALID_JSON:
+                # If not valid JSON, return empty string
+                return ""
             
-            field_value = getattr(doc, field_name, None)
-            if field_value:
-                try:
-                    # Try to parse as JSON
-                    json_data = json.loads(field_value)
-                    
-                    # Check if we have a wildcard pattern
-                    if 'ARRAY' in nested_path:
-                        return _handle_wildcard_pattern(json_data, nested_path)
-                    
-                    # Navigate through the nested path using the helper function
-                    current_data = _navigate_nested_path(json_data, nested_path)
-                    
-                    if current_data is not None:
-                        return str(current_data)
-                    else:
-                        return ""
-                except json.JSONDecodeError:
-                    # If not valid JSON, return empty string
-                    return ""
+            # Check if we have a wildcard pattern
+            if steps is None:
+                return _handle_wildcard_pattern(json_data, nested_path)
+            
+            # Navigate through the nested path using the pre-compiled steps
+            current_data = _follow_compiled_path(json_data, steps)
+            
+            if current_data is not None:
+                return str(current_data)
             else:
                 return ""
         else:
-            # Handle regular doc field variables
-            field_value = getattr(doc, variable_name, None)
-            if field_value is not None:
-                return str(field_value)
-            else:
-                return ""
+            return ""
     except (AttributeError, IndexError, ValueError):
         return match.group(0)
 
+# {{security field}} and [[holding field]] placeholders of a ***HOLDINGS*** section, found in one pass
+_HOLDINGS_SECTION_VARIABLE_PATTERN = re.compile(r'\{\{[\w\.]+\}\}|\[\[[\w\.]+\]\]')
+
+def compile_holdings_section(section):
+    """
+    Split a ***HOLDINGS*** section into literal text and variable matches once,
+    so rendering it for every holding needs no regex work.
+    Variables are kept as (is_security_variable, match) pairs for replace_variables.
+    """
+    parts = []
+    position = 0
+    for match in _HOLDINGS_SECTION_VARIABLE_PATTERN.finditer(section):
+        parts.append(section[position:match.start()])
+        if section.startswith('{{', match.start()):
+            parts.append((True, SECURITY_VARIABLE_PATTERN.match(section, match.start())))
+        else:
+            parts.append((False, HOLDING_VARIABLE_PATTERN.match(section, match.start())))
+        position = match.end()
+    parts.append(section[position:])
+    return parts
+
+def render_holdings_section(compiled_section, security_doc, holding_doc, cache=None):
+    """Render a section from compile_holdings_section for one holding and its security"""
+    return "".join(
+        part if isinstance(part, str) else replace_variables(part[1], security_doc if part[0] else holding_doc, cache)
+        for part in compiled_section
+    )
+
+# Control characters stripped from AI responses; tabs are expanded to four spaces
+_CONTROL_CHARACTERS_TABLE = dict.fromkeys([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F])
+_CONTROL_CHARACTERS_TABLE[ord('\t')] = '    '
+
+# A JSON string literal honouring backslash escapes (an unterminated literal runs to the end of input),
+# or an escape pair outside a string so an escaped quote there does not open a literal
+_JSON_STRING_PATTERN = re.compile(r'\\.|"(?:\\.|[^"\\])*(?:"|\\?\Z)', re.DOTALL)
+
+def _escape_json_string_newlines(match):
+    literal = match.group(0)
+    if literal[0] != '"':
+        return literal
+    return literal.replace('\n', '\\n').replace('\r', '\\r')
+
 def clear_string(content_string: str) -> dict:
     """
     Convert a string to a JSON object.
     If the string is not valid JSON, return an empty dictionary.
     """
+    # Well-formed responses need no cleanup beyond HTML entities
+    stripped = content_string.strip()
+    if stripped[:1] in ('{', '['):
+        try:
+            json_loads(stripped)
+            return stripped.replace('&nbsp;', ' ')
+        except ValueError:
+            pass
+
     # Parse the JSON from the content string, removing any Markdown formatting
-    if content_string.startswith('```') and '```' in content_string[3:]:
-        # Extract content between the first and last backtick markers
-        content_string = content_string.split('```', 2)[1]
+    closing_fence = content_string.find('```', 3) if content_string.startswith('```') else -1
+    if closing_fence != -1:
+        # Extract content between the opening fence and the next backtick marker
+        content_string = content_string[3:closing_fence]
         # Remove the language identifier if present (e.g., 'json\n')
-        if '\n' in content_string:
-            content_string = content_string.split('\n', 1)[1]
-        # Remove trailing backticks if any remain
-        if '```' in content_string:
-            content_string = content_string.split('```')[0]
-
-    # Replace problematic control characters and normalize whitespace
-    content_string = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', content_string)
-    
-    # Fix JSON formatting issues - improved approach for handling newlines in strings
-    # First, properly escape newlines that appear within JSON string values
-    lines = content_string.split('\n')
-    fixed_content = []
-    current_line = ""
-    in_string = False
-    escape_next = False
-    
-    for line in lines:
-        i = 0
-        while i < len(line):
-            char = line[i]
-            
-            if escape_next:
-                current_line += char
-                escape_next = False
-            elif char == '\\':
-                current_line += char
-                escape_next = True
-            elif char == '"' and not escape_next:
-                current_line += char
-                in_string = not in_string
-            else:
-                current_line += char
-            
-            i += 1
-        
-        # If we're at the end of a line and inside a string, escape the newline
-        if in_string and line != lines[-1]:  # Not the last line
-            current_line += '\\n'
-        else:
-            # We're not in a string or this is the last line
-            fixed_content.append(current_line)
-            current_line = ""
-    
-    # Add any remaining content
-    if current_line:
-        fixed_content.append(current_line)
+        _, newline, body = content_string.partition('\n')
+        if newline:
+            content_string = body
+
+    # Replace problematic control characters and normalize whitespace in a single pass
+    content_string = content_string.translate(_CONTROL_CHARACTERS_TABLE)
     
-    content_string = '\n'.join(fixed_content)
+    # Fix JSON formatting issues - escape raw newlines that appear within JSON string values
+    content_string = _JSON_STRING_PATTERN.sub(_escape_json_string_newlines, content_string)
     
     # Additional cleanup for HTML entities and special characters
     content_string = content_string.replace('&nbsp;', ' ')
-    content_string = content_string.replace('\t', '    ')
     
     return content_string
 
@@ -189,20 +329,67 @@ def _parse_json_field(field_value):
         return field_value
     if isinstance(field_value, str):
         try:
-            return json.loads(field_value)
+            return json_loads(field_value)
         except json.JSONDecodeError:
             return None
     return None
 
 
+def _format_markdown_cell(value):
+    """Render one table cell, leaving missing values blank."""
+    if value is None:
+        return ""
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _rows_to_markdown_table(columns, rows):
+    """Emit a markdown table from column labels and (index, values) rows."""
+    lines = [
+        "| " + " | ".join(_format_markdown_cell(c) for c in ["", *columns]) + " |",
+        "|" + "|".join(["---"] * (len(columns) + 1)) + "|",
+    ]
+    lines.extend(
+        "| " + " | ".join(_format_markdown_cell(c) for c in (index, *values)) + " |"
+        for index, values in rows
+    )
+    return "\n".join(lines)
+
+
 def _json_to_markdown_table(data):
     """Convert a JSON-like object to a markdown table; return empty string if impossible."""
     try:
-        import pandas as pd
-
         if data is None:
             return ""
 
+        # Records and dict-of-dicts (the shapes yfinance statements are stored in) are
+        # emitted directly; anything else goes through a DataFrame. The direct tables are
+        # unpadded, print numbers with str() (full precision, unlike tabulate's "g" format)
+        # and leave missing cells blank
+        if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+            columns = list(dict.fromkeys(key for row in data for key in row))
+            rows = [(i, [row.get(c) for c in columns]) for i, row in enumerate(data)]
+        elif isinstance(data, dict) and all(isinstance(v, dict) for v in data.values()):
+            columns = list(dict.fromkeys(key for row in data.values() for key in row))
+            rows = [(key, [row.get(c) for c in columns]) for key, row in data.items()]
+        elif isinstance(data, dict) and not any(isinstance(v, (dict, list)) for v in data.values()):
+            columns = list(data)
+            rows = [(0, list(data.values()))]
+        else:
+            return _dataframe_to_markdown_table(data)
+
+        if not columns or not rows:
+            return ""
+
+        return _rows_to_markdown_table(columns, rows)
+    except Exception:
+        return ""
+
+
+def _dataframe_to_markdown_table(data):
+    """Convert mixed JSON-like shapes to a markdown table via pandas; return empty string if impossible."""
+    try:
+        import pandas as pd
+
         if isinstance(data, list):
             df = pd.DataFrame(data)
         elif isinstance(data, dict):
@@ -222,13 +409,14 @@ def _json_to_markdown_table(data):
         return ""
 
 
-def get_cached_yfinance_data(security, annual_years=None, quarterly_count=None):
+def get_cached_yfinance_data(security, annual_years=None, quarterly_count=None, cache=None):
     """Return yfinance-stored statements from CF Security as structured objects.
     
     Args:
         security: CF Security document
         annual_years: Number of annual periods to return (None = all)
         quarterly_count: Number of quarterly periods to return (None = all)
+        cache: Optional per-prompt dict, so each stored statement is parsed once per prompt
     """
     def _slice_periods(data, count):
         """Slice JSON data to requested number of periods."""
@@ -236,17 +424,26 @@ def get_cached_yfinance_data(security, annual_years=None, quarterly_count=None):
             return data
         if isinstance(data, dict):
             # Assumes dict keys are period labels (dates); take first N items
-            return dict(list(data.items())[:count])
+            return dict(islice(data.items(), count))
         elif isinstance(data, list):
             return data[:count]
         return data
     
-    annual_income = _parse_json_field(getattr(security, "profit_loss", None))
-    quarterly_income = _parse_json_field(getattr(security, "quarterly_profit_loss", None))
-    annual_balance = _parse_json_field(getattr(security, "balance_sheet", None))
-    quarterly_balance = _parse_json_field(getattr(security, "quarterly_balance_sheet", None))
-    annual_cashflow = _parse_json_field(getattr(security, "cash_flow", None))
-    quarterly_cashflow = _parse_json_field(getattr(security, "quarterly_cash_flow", None))
+    def _get_statement(field_name):
+        """Parse a stored statement field, reusing the parse from cache when given."""
+        if cache is None:
+            return _parse_json_field(getattr(security, field_name, None))
+        key = ("yfinance", security.doctype, security.name, field_name)
+        if key not in cache:
+            cache[key] = _parse_json_field(getattr(security, field_name, None))
+        return cache[key]
+    
+    annual_income = _get_statement("profit_loss")
+    quarterly_income = _get_statement("quarterly_profit_loss")
+    annual_balance = _get_statement("balance_sheet")
+    quarterly_balance = _get_statement("quarterly_balance_sheet")
+    annual_cashflow = _get_statement("cash_flow")
+    quarterly_cashflow = _get_statement("quarterly_cash_flow")
     
     return {
         "income_statement_annual": _slice_periods(annual_income, annual_years),
@@ -278,10 +475,11 @@ def _render_yfinance_markdown(yf_data):
     return "\n\n".join(sections)
 
 
-def expand_financials_variable(security, annual_years: int, quarterly_count: int):
+def expand_financials_variable(security, annual_years: int, quarterly_count: int, cache=None):
     """
     Resolve {{financials:yX:qY}} using edgar cache first (via get_edgar_data),
     then fall back to yfinance JSON stored on CF Security. Returns JSON formatted as string.
+    Pass the prompt's variables cache so repeated placeholders share one parse of each statement.
     """
     # 1) Try edgar cache via existing helper (may rely on cached files)
     cik = getattr(security, "cik", None)
@@ -300,15 +498,17 @@ def expand_financials_variable(security, annual_years: int, quarterly_count: int
             pass
 
     # 2) Fallback to yfinance cached JSON
-    yf_data = get_cached_yfinance_data(security, annual_years, quarterly_count)
+    yf_data = get_cached_yfinance_data(security, annual_years, quarterly_count, cache)
     if any(yf_data.values()):
-        import json
-        return json.dumps(yf_data, indent=2)
+        return json_dumps(yf_data, indent=True)
 
     # 3) Placeholder if nothing available
     return '{"error": "financial data unavailable"}'
 
 
+EDGAR_DATA_CACHE_TTL = 6 * 60 * 60
+
+
 def _init_edgar_local_storage() -> str:
     """Ensure edgartools uses the site-scoped cache directory.
 
@@ -333,7 +533,8 @@ def get_edgar_data(
     annual_years: int = 10,
     quarterly_count: int = 16,
     format: str = "json",
-    statement_types: list = None
+    statement_types: list = None,
+    refresh: bool = False
 ) -> str:
     """
     Fetch and return financial statements from SEC EDGAR filings using statement stitching.
@@ -350,21 +551,14 @@ def get_edgar_data(
         statement_types: List of statement types to retrieve. 
                         Options: 'income', 'balance', 'cashflow', 'equity'
                         Default: all statements
+        refresh: Skip the cached result and fetch again, invalidating every cached result
+                 for this CIK (the new result is still cached)
     
     Returns:
         A single text string containing all requested financial statements
         in the specified format (json, csv, or markdown), with data from
         multiple periods stitched together.
     """
-    cache_dir = _init_edgar_local_storage()
-
-    from edgar import set_identity, Company, use_local_storage, set_local_storage_path
-    from edgar.xbrl import XBRLS
-    import json as json_module
-
-    set_local_storage_path(cache_dir)
-    use_local_storage(cache_dir, True)
-
     if statement_types is None:
         statement_types = ['income', 'balance', 'cashflow', 'equity']
     
@@ -373,12 +567,40 @@ def get_edgar_data(
     if format not in valid_formats:
         raise ValueError(f"Format must be one of {valid_formats}, got '{format}'")
 
+    # Stitching many filings is expensive, so reuse a recent result for the same request.
+    # Keys carry a per-CIK generation; a refresh starts a new one, which invalidates the
+    # cached results for every combination of periods, format and statement types at once.
+    generation_key = f"cf_edgar_data_generation:{cik}"
+    if refresh:
+        generation = frappe.generate_hash(length=10)
+        frappe.cache().set_value(generation_key, generation)
+    else:
+        generation = frappe.cache().get_value(generation_key) or "0"
+    cache_key = (
+        f"cf_edgar_data:{cik}:{generation}:{annual_years}:{quarterly_count}:{format}:"
+        f"{','.join(sorted(statement_types))}"
+    )
+    if not refresh:
+        cached_result = frappe.cache().get_value(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+    cache_dir = _init_edgar_local_storage()
+
+    from edgar import set_identity, Company, use_local_storage, set_local_storage_path
+    from edgar.xbrl import XBRLS
+
+    set_local_storage_path(cache_dir)
+    use_local_storage(cache_dir, True)
+
     set_identity("phalouvas@gmail.com")
 
     company = Company(cik)
     
     # Dictionary to store all statement data
     all_data = {}
+    # Statements and periods that failed; results with failures are not cached
+    failures = []
 
     # Helper function to convert statement to desired format
     def convert_statement_to_format(statement, stmt_name, format_type):
@@ -386,171 +608,119 @@ def get_edgar_data(
             df = statement.to_dataframe()
             
             if format_type == 'json':
+                # Plain records are serialized once with the rest of all_data, not round-tripped through JSON here;
+                # missing cells become None so they are written as null like to_json did
                 return {
                     'statement': stmt_name,
-                    'periods': len(df.columns) if hasattr(df, 'columns') else 0,
-                    'data': json_module.loads(df.to_json(orient='records'))
+                    'periods': df.shape[1] if hasattr(df, 'shape') else 0,
+                    'data': df.astype(object).where(df.notna(), None).to_dict(orient='records')
                 }
             elif format_type == 'csv':
                 return f"# {stmt_name}\n" + df.to_csv(index=True)
             elif format_type == 'markdown':
                 return f"# {stmt_name}\n" + df.to_markdown(index=True)
         except Exception as e:
+            failures.append(stmt_name)
             return {
                 'statement': stmt_name,
                 'error': str(e)
             } if format_type == 'json' else f"# {stmt_name}\nError: {str(e)}\n"
 
-    # ===== ANNUAL DATA =====
-    if annual_years > 0:
+    # (statement type, all_data key prefix, statement method, display name)
+    statement_specs = [
+        ('income', 'income_statement', 'income_statement', 'Income Statement'),
+        ('balance', 'balance_sheet', 'balance_sheet', 'Balance Sheet'),
+        ('cashflow', 'cashflow_statement', 'cashflow_statement', 'Cash Flow Statement'),
+        ('equity', 'equity_statement', 'statement_of_equity', 'Statement of Equity'),
+    ]
+
+    # Stitch one period set (annual 10-K or quarterly 10-Q) and convert its statements
+    def stitch_period_statements(filings, max_periods, period_name):
+        period_data = {}
         try:
-            # Get multiple 10-K filings for annual statements
-            annual_filings = company.get_filings(form="10-K").head(annual_years)
-            
-            if len(annual_filings) > 0:
-                # Create stitched view across multiple annual filings
-                xbrls_annual = XBRLS.from_filings(annual_filings)
-                statements_annual = xbrls_annual.statements
-
-                # Fetch and convert annual income statement
-                if 'income' in statement_types:
-                    try:
-                        income_annual = statements_annual.income_statement(max_periods=annual_years)
-                        all_data['income_statement_annual'] = convert_statement_to_format(
-                            income_annual, 'Income Statement (Annual)', format
-                        )
-                    except Exception as e:
-                        all_data['income_statement_annual'] = {
-                            'statement': 'Income Statement (Annual)',
-                            'error': str(e)
-                        } if format == 'json' else f"# Income Statement (Annual)\nError: {str(e)}\n"
-
-                # Fetch and convert annual balance sheet
-                if 'balance' in statement_types:
-                    try:
-                        balance_annual = statements_annual.balance_sheet(max_periods=annual_years)
-                        all_data['balance_sheet_annual'] = convert_statement_to_format(
-                            balance_annual, 'Balance Sheet (Annual)', format
-                        )
-                    except Exception as e:
-                        all_data['balance_sheet_annual'] = {
-                            'statement': 'Balance Sheet (Annual)',
-                            'error': str(e)
-                        } if format == 'json' else f"# Balance Sheet (Annual)\nError: {str(e)}\n"
-
-                # Fetch and convert annual cash flow statement
-                if 'cashflow' in statement_types:
-                    try:
-                        cashflow_annual = statements_annual.cashflow_statement(max_periods=annual_years)
-                        all_data['cashflow_statement_annual'] = convert_statement_to_format(
-                            cashflow_annual, 'Cash Flow Statement (Annual)', format
-                        )
-                    except Exception as e:
-                        all_data['cashflow_statement_annual'] = {
-                            'statement': 'Cash Flow Statement (Annual)',
-                            'error': str(e)
-                        } if format == 'json' else f"# Cash Flow Statement (Annual)\nError: {str(e)}\n"
-
-                # Fetch and convert statement of equity (if available)
-                if 'equity' in statement_types:
-                    try:
-                        equity_annual = statements_annual.statement_of_equity(max_periods=annual_years)
-                        all_data['equity_statement_annual'] = convert_statement_to_format(
-                            equity_annual, 'Statement of Equity (Annual)', format
-                        )
-                    except Exception as e:
-                        all_data['equity_statement_annual'] = {
-                            'statement': 'Statement of Equity (Annual)',
+            # Create a stitched view across the filings
+            statements = XBRLS.from_filings(filings).statements
+
+            for statement_type, key, method, label in statement_specs:
+                if statement_type not in statement_types:
+                    continue
+                stmt_name = f"{label} ({period_name})"
+                try:
+                    statement = getattr(statements, method)(max_periods=max_periods)
+                    period_data[f"{key}_{period_name.lower()}"] = convert_statement_to_format(
+                        statement, stmt_name, format
+                    )
+                except Exception as e:
+                    failures.append(stmt_name)
+                    # The statement of equity is optional in many filings
+                    if statement_type == 'equity':
+                        period_data[f"{key}_{period_name.lower()}"] = {
+                            'statement': stmt_name,
                             'error': f"Statement not available: {str(e)}"
-                        } if format == 'json' else f"# Statement of Equity (Annual)\nNot available: {str(e)}\n"
+                        } if format == 'json' else f"# {stmt_name}\nNot available: {str(e)}\n"
+                    else:
+                        period_data[f"{key}_{period_name.lower()}"] = {
+                            'statement': stmt_name,
+                            'error': str(e)
+                        } if format == 'json' else f"# {stmt_name}\nError: {str(e)}\n"
         except Exception as e:
-            all_data['annual_error'] = {
-                'error_type': 'Annual data retrieval failed',
-                'message': str(e)
-            } if format == 'json' else f"\n# Annual Data Error\n{str(e)}\n"
+            period_data.update(period_error(period_name, e))
+        return period_data
 
-    # ===== QUARTERLY DATA =====
+    def period_error(period_name, error):
+        failures.append(period_name)
+        return {
+            f"{period_name.lower()}_error": {
+                'error_type': f"{period_name} data retrieval failed",
+                'message': str(error)
+            } if format == 'json' else f"\n# {period_name} Data Error\n{str(error)}\n"
+        }
+
+    periods = []
+    if annual_years > 0:
+        periods.append(("10-K", annual_years, "Annual"))
     if quarterly_count > 0:
-        try:
-            # Get multiple 10-Q filings for quarterly statements
-            quarterly_filings = company.get_filings(form="10-Q").head(quarterly_count)
-            
-            if len(quarterly_filings) > 0:
-                # Create stitched view across multiple quarterly filings
-                xbrls_quarterly = XBRLS.from_filings(quarterly_filings)
-                statements_quarterly = xbrls_quarterly.statements
-
-                # Fetch and convert quarterly income statement
-                if 'income' in statement_types:
-                    try:
-                        income_quarterly = statements_quarterly.income_statement(max_periods=quarterly_count)
-                        all_data['income_statement_quarterly'] = convert_statement_to_format(
-                            income_quarterly, 'Income Statement (Quarterly)', format
-                        )
-                    except Exception as e:
-                        all_data['income_statement_quarterly'] = {
-                            'statement': 'Income Statement (Quarterly)',
-                            'error': str(e)
-                        } if format == 'json' else f"# Income Statement (Quarterly)\nError: {str(e)}\n"
-
-                # Fetch and convert quarterly balance sheet
-                if 'balance' in statement_types:
-                    try:
-                        balance_quarterly = statements_quarterly.balance_sheet(max_periods=quarterly_count)
-                        all_data['balance_sheet_quarterly'] = convert_statement_to_format(
-                            balance_quarterly, 'Balance Sheet (Quarterly)', format
-                        )
-                    except Exception as e:
-                        all_data['balance_sheet_quarterly'] = {
-                            'statement': 'Balance Sheet (Quarterly)',
-                            'error': str(e)
-                        } if format == 'json' else f"# Balance Sheet (Quarterly)\nError: {str(e)}\n"
-
-                # Fetch and convert quarterly cash flow statement
-                if 'cashflow' in statement_types:
-                    try:
-                        cashflow_quarterly = statements_quarterly.cashflow_statement(max_periods=quarterly_count)
-                        all_data['cashflow_statement_quarterly'] = convert_statement_to_format(
-                            cashflow_quarterly, 'Cash Flow Statement (Quarterly)', format
-                        )
-                    except Exception as e:
-                        all_data['cashflow_statement_quarterly'] = {
-                            'statement': 'Cash Flow Statement (Quarterly)',
-                            'error': str(e)
-                        } if format == 'json' else f"# Cash Flow Statement (Quarterly)\nError: {str(e)}\n"
-
-                # Fetch and convert quarterly statement of equity (if available)
-                if 'equity' in statement_types:
-                    try:
-                        equity_quarterly = statements_quarterly.statement_of_equity(max_periods=quarterly_count)
-                        all_data['equity_statement_quarterly'] = convert_statement_to_format(
-                            equity_quarterly, 'Statement of Equity (Quarterly)', format
-                        )
-                    except Exception as e:
-                        all_data['equity_statement_quarterly'] = {
-                            'statement': 'Statement of Equity (Quarterly)',
-                            'error': f"Statement not available: {str(e)}"
-                        } if format == 'json' else f"# Statement of Equity (Quarterly)\nNot available: {str(e)}\n"
-        except Exception as e:
-            all_data['quarterly_error'] = {
-                'error_type': 'Quarterly data retrieval failed',
-                'message': str(e)
-            } if format == 'json' else f"\n# Quarterly Data Error\n{str(e)}\n"
+        periods.append(("10-Q", quarterly_count, "Quarterly"))
+
+    # Filing lists are fetched on this thread, so the shared Company object is never used
+    # concurrently. Only the XBRL stitching runs in parallel: each worker gets its own,
+    # disjoint list of Filing objects (10-K vs 10-Q) and builds its own XBRLS from them,
+    # so the workers share no edgartools objects and write different filings to local storage.
+    with ThreadPoolExecutor(max_workers=max(len(periods), 1)) as executor:
+        period_results = []
+        for form_type, max_periods, period_name in periods:
+            try:
+                # Get multiple filings for the stitched statements
+                filings = company.get_filings(form=form_type).head(max_periods)
+            except Exception as e:
+                period_results.append(period_error(period_name, e))
+                continue
+            if len(filings) > 0:
+                period_results.append(
+                    executor.submit(stitch_period_statements, filings, max_periods, period_name)
+                )
+
+        # Collect in period order so annual data always precedes quarterly data
+        for result in period_results:
+            all_data.update(result.result() if isinstance(result, Future) else result)
 
     # Combine all data into a single text string
     if format == 'json':
-        result = json_module.dumps(all_data, indent=2)
+        result = json_dumps(all_data, indent=True)
     elif format == 'csv':
-        result = "\n".join([
+        result = "\n".join(
             stmt_data if isinstance(stmt_data, str) else f"# {stmt_data.get('statement', 'Unknown')}\n"
             for stmt_data in all_data.values()
-        ])
+        )
     elif format == 'markdown':
-        result = "\n\n".join([
+        result = "\n\n".join(
             stmt_data if isinstance(stmt_data, str) else f"## {stmt_data.get('statement', 'Unknown')}\n\nError: {stmt_data.get('error', 'Unknown error')}"
             for stmt_data in all_data.values()
-        ])
+        )
 
+    # A transient SEC or network failure must not be served from the cache
+    if not failures:
+        frappe.cache().set_value(cache_key, result, expires_in_sec=EDGAR_DATA_CACHE_TTL)
     return result
 
 
@@ -636,11 +806,8 @@ def get_edgar_section(
                     eightk = filing.obj()
                     
                     # Add metadata header
-                    metadata = f"**8-K Filing**\n"
-                    metadata += f"Filed: {filing.filing_date}\n"
-                    if hasattr(filing, 'accession_no'):
-                        metadata += f"Accession: {filing.accession_no}\n"
-                    metadata += f"\n"
+                    accession = f"Accession: {filing.accession_no}\n" if hasattr(filing, 'accession_no') else ""
+                    metadata = f"**8-K Filing**\nFiled: {filing.filing_date}\n{accession}\n"
                     
                     # Extract all reported items
                     items_content = []
@@ -718,13 +885,9 @@ def get_edgar_section(
             data_obj = filing.obj()
             
             # Add metadata header
-            metadata = f"**{form_type} Filing**\n"
-            metadata += f"Filed: {filing.filing_date}\n"
-            if hasattr(filing, 'period_end_date'):
-                metadata += f"Period: {filing.period_end_date}\n"
-            if hasattr(filing, 'accession_no'):
-                metadata += f"Accession: {filing.accession_no}\n"
-            metadata += f"\n"
+            period = f"Period: {filing.period_end_date}\n" if hasattr(filing, 'period_end_date') else ""
+            accession = f"Accession: {filing.accession_no}\n" if hasattr(filing, 'accession_no') else ""
+            metadata = f"**{form_type} Filing**\nFiled: {filing.filing_date}\n{period}{accession}\n"
             
             content_parts.append(metadata)
             
@@ -0,0 +1,69 @@
+# Copyright (c) 2025, KAINOTOMO PH LTD and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from cognitive_folio.utils.helper import _json_to_markdown_table, replace_variables, HOLDING_VARIABLE_PATTERN
+
+
+class TestJsonToMarkdownTable(FrappeTestCase):
+	def test_dict_of_dicts(self):
+		data = {
+			"2024-12-31": {"Revenue": 391035000000.0, "Net Income": 93736000000.0},
+			"2023-12-31": {"Revenue": 383285000000.0, "Other": "a|b"},
+		}
+		self.assertEqual(
+			_json_to_markdown_table(data),
+			"|  | Revenue | Net Income | Other |\n"
+			"|---|---|---|---|\n"
+			"| 2024-12-31 | 391035000000.0 | 93736000000.0 |  |\n"
+			"| 2023-12-31 | 383285000000.0 |  | a\\|b |",
+		)
+
+	def test_records(self):
+		data = [{"a": 1, "b": None}, {"b": 2.5}]
+		self.assertEqual(
+			_json_to_markdown_table(data),
+			"|  | a | b |\n"
+			"|---|---|---|\n"
+			"| 0 | 1 |  |\n"
+			"| 1 |  | 2.5 |",
+		)
+
+	def test_flat_dict(self):
+		self.assertEqual(
+			_json_to_markdown_table({"a": 1, "b": "x"}),
+			"|  | a | b |\n"
+			"|---|---|---|\n"
+			"| 0 | 1 | x |",
+		)
+
+	def test_empty(self):
+		self.assertEqual(_json_to_markdown_table(None), "")
+		self.assertEqual(_json_to_markdown_table({}), "")
+		self.assertEqual(_json_to_markdown_table([]), "")
+		self.assertEqual(_json_to_markdown_table({"2024-12-31": {}}), "")
+
+
+class TestReplaceVariables(FrappeTestCase):
+	def render(self, template, doc):
+		cache = {}
+		return HOLDING_VARIABLE_PATTERN.sub(lambda match: replace_variables(match, doc, cache), template)
+
+	def test_nested_variable_on_hydrated_frappe_dict(self):
+		# JSON fields already hydrated on the document in memory are frappe._dict, not plain dicts
+		doc = frappe._dict(
+			doctype="CF Portfolio Holding",
+			name="test-holding",
+			data=frappe._dict(key="value", items=[frappe._dict(title="first")]),
+			news=[frappe._dict(title="first"), frappe._dict(title="second")],
+		)
+		self.assertEqual(self.render("[[data.key]]", doc), "value")
+		self.assertEqual(self.render("[[data.items.0.title]]", doc), "first")
+		self.assertEqual(self.render("[[data.missing]]", doc), "")
+		self.assertEqual(self.render("[[news.ARRAY.title]]", doc), "first, second")
+
+	def test_nested_variable_on_json_string(self):
+		doc = frappe._dict(doctype="CF Portfolio Holding", name="test-holding", data='{"key": "value"}')
+		self.assertEqual(self.render("[[data.key]]", doc), "value")
@@ -44,7 +44,7 @@ def _clean_detected_url(url: str) -> str:
 
 def _get_settings_limits():
     try:
-        settings = frappe.get_single("CF Settings")
+        settings = frappe.get_cached_doc("CF Settings")
         max_urls = getattr(settings, "max_url_fetch", None) or DEFAULT_MAX_URLS
         timeout = getattr(settings, "url_fetch_timeout", None) or DEFAULT_TIMEOUT
         html_max_bytes = getattr(settings, "url_html_max_bytes", None) or DEFAULT_HTML_MAX_BYTES